@@ -0,0 +1,127 @@
+import asyncio
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+
+class MockClientError(Exception):
+    """
+    Mirrors binance connector ClientError / ServerError attributes read by BinanceDriver.
+    """
+
+    def __init__(self, status_code: int, header: dict, message: str):
+        super().__init__(f'{status_code} {message}')
+        self.status_code = status_code
+        self.header = header
+        self.error_message = message
+
+
+def _usage(headers: dict) -> dict:
+    return {key: value for key, value in headers.items() if key.lower().startswith('x-mbx-')}
+
+
+def _decode(status: int, headers: dict, body: bytes, show_limit_usage: bool):
+    data = json.loads(body)
+    if status >= 400:
+        raise MockClientError(status, headers, data.get('msg', ''))
+    if show_limit_usage:
+        return {'limit_usage': _usage(headers), 'data': data}
+    return data
+
+
+class MockClient:
+    """
+    Stdlib keep-alive client of MockExchange with binance connector interface, connection per thread.
+    Latencies of all calls are stored for percentiles.
+
+    Args:
+        base_url (str): MockExchange url.
+        show_limit_usage (bool): wrap response with limit usage headers like connector does.
+        timeout (float): socket timeout in seconds.
+        latencies (list): list to store latencies in, shared by clients of one run.
+    """
+
+    def __init__(self, base_url: str, show_limit_usage: bool = True, timeout: float = 30., latencies: list = None):
+        url = urlparse(base_url)
+        self.host, self.port = url.hostname, url.port
+        self.show_limit_usage = show_limit_usage
+        self.timeout = timeout
+        self.latencies = list() if latencies is None else latencies
+
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port,
+                                                                             timeout=self.timeout)
+        return connection
+
+    def _get(self, path: str, params: dict):
+        started = time.perf_counter()
+        connection = self._connection()
+        try:
+            connection.request('GET', f'{path}?{urlencode(params)}')
+            response = connection.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+        self.latencies.append(time.perf_counter() - started)
+        return _decode(response.status, dict(response.getheaders()), body, self.show_limit_usage)
+
+    def klines(self, symbol: str, interval: str, **kwargs):
+        return self._get('/api/v3/klines', {'symbol': symbol, 'interval': interval, **kwargs})
+
+
+class AsyncMockClient:
+    """
+    Asyncio keep-alive client of MockExchange, connections are pooled on the event loop.
+
+    Args:
+        base_url (str): MockExchange url.
+        show_limit_usage (bool): wrap response with limit usage headers like connector does.
+    """
+
+    def __init__(self, base_url: str, show_limit_usage: bool = True):
+        url = urlparse(base_url)
+        self.host, self.port = url.hostname, url.port
+        self.show_limit_usage = show_limit_usage
+        self.latencies = list()
+
+        self._connections = list()
+
+    async def _get(self, path: str, params: dict):
+        started = time.perf_counter()
+        if self._connections:
+            reader, writer = self._connections.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(f'GET {path}?{urlencode(params)} HTTP/1.1\r\nHost: {self.host}\r\n\r\n'.encode())
+            status_line = await reader.readline()
+            headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                key, _, value = line.decode().partition(':')
+                headers[key.strip()] = value.strip()
+            body = await reader.readexactly(int(headers['Content-Length']))
+        except Exception:
+            writer.close()
+            raise
+        self._connections.append((reader, writer))
+        self.latencies.append(time.perf_counter() - started)
+        return _decode(int(status_line.split()[1]), headers, body, self.show_limit_usage)
+
+    async def klines(self, symbol: str, interval: str, **kwargs):
+        return await self._get('/api/v3/klines', {'symbol': symbol, 'interval': interval, **kwargs})
+
+    def close(self):
+        for _, writer in self._connections:
+            writer.close()
+        self._connections = list()
@@ -0,0 +1,153 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from multiparser.parsers.binance import INTERVALS_MS
+
+
+def latency_from_spec(spec: str) -> callable:
+    """
+    Args:
+        spec (str): 'const:SECONDS', 'uniform:LOW:HIGH' or 'lognormal:MEDIAN:SIGMA'.
+
+    Returns:
+        callable: returns seconds to delay response for.
+    """
+    kind, *params = spec.split(':')
+    params = [float(param) for param in params]
+    if kind == 'const':
+        return lambda: params[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(*params)
+    if kind == 'lognormal':
+        median, sigma = params
+        return lambda: median * random.lognormvariate(0, sigma)
+    raise ValueError(f'unknown latency spec {spec}')
+
+
+def make_klines(start_time: int, interval: str, limit: int) -> list:
+    """
+    Deterministic klines rows in exchange format starting at start_time.
+    """
+    step = INTERVALS_MS[interval]
+    start_time -= start_time % step
+    rows = list()
+    for i in range(limit):
+        open_time = start_time + i * step
+        price = 30000 + (open_time // step) % 1000
+        rows.append([open_time, f'{price:.8f}', f'{price + 5:.8f}', f'{price - 5:.8f}', f'{price + 1:.8f}',
+                     '12.34500000', open_time + step - 1, '370350.00000000', 100 + i % 50, '6.17200000',
+                     '185175.00000000', '0'])
+    return rows
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    # headers and body are separate writes, with Nagle and delayed ack the body would wait ~40ms for ack
+    disable_nagle_algorithm = True
+
+    def log_message(self, *_):
+        pass
+
+    def _reply(self, status: int, body: 'list | dict', headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or dict()).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        exchange = self.server.exchange
+        url = urlparse(self.path)
+        if url.path != '/api/v3/klines':
+            self._reply(404, {'code': -1, 'msg': 'not found'})
+            return
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        time.sleep(exchange.latency())
+        allowed, used, retry_after = exchange.consume(exchange.weight)
+        headers = {f'x-mbx-used-weight-{exchange.window_header}': used}
+        if not allowed:
+            headers['Retry-After'] = retry_after
+            self._reply(429, {'code': -1003, 'msg': 'Too many requests'}, headers)
+            return
+        if random.random() < exchange.error_rate:
+            self._reply(500, {'code': -1000, 'msg': 'injected error'}, headers)
+            return
+
+        limit = int(query.get('limit', 500))
+        if exchange.rows is not None:
+            limit = min(limit, exchange.rows)
+        start_time = int(query.get('startTime', 0))
+        self._reply(200, make_klines(start_time, query.get('interval', '1m'), limit), headers)
+
+
+class MockExchange:
+    """
+    Local HTTP mock of klines endpoint served from a background thread.
+
+    Args:
+        latency (str): latency spec, see latency_from_spec.
+        rows (int): max rows in response, requested limit if None.
+        weight_limit (int): weight allowed per window, 429 with Retry-After above it. Unlimited if None.
+        window (int): weight window in seconds.
+        weight (int): weight of single klines request.
+        error_rate (float): share of requests answered with 500.
+        host (str): host to bind.
+        port (int): port to bind, any free one if 0.
+    """
+
+    def __init__(self, latency: str = 'const:0.01', rows: int = None, weight_limit: int = None, window: int = 60,
+                 weight: int = 2, error_rate: float = 0., host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency_from_spec(latency)
+        self.rows = rows
+        self.weight_limit = weight_limit
+        self.window = window
+        self.window_header = f'{window}s'
+        self.weight = weight
+        self.error_rate = error_rate
+
+        self._used = 0
+        self._window_start = 0
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.exchange = self
+        self._working_thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def consume(self, weight: int) -> tuple:
+        """
+        Returns:
+            tuple: (allowed, weight used in window, seconds till window end).
+        """
+        with self._lock:
+            now = time.time()
+            window_start = now - now % self.window
+            if window_start != self._window_start:
+                self._window_start, self._used = window_start, 0
+            retry_after = int(window_start + self.window - now) + 1
+            if self.weight_limit is not None and self._used + weight > self.weight_limit:
+                return False, self._used, retry_after
+            self._used += weight
+            return True, self._used, retry_after
+
+    def start(self):
+        self._working_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._working_thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._working_thread.join()
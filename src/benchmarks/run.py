@@ -0,0 +1,203 @@
+"""
+Throughput benchmark against local MockExchange.
+
+    cd src && python -m benchmarks.run --n_workers 4,16 --rps 100,1000 --driver thread,async --out new.json \
+        --compare old.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import resource
+import time
+from functools import partial
+
+import numpy as np
+
+from benchmarks.client import AsyncMockClient, MockClient
+from benchmarks.mock_exchange import MockExchange
+from multiparser.core.async_driver import AsyncMultiDriver
+from multiparser.core.metrics import Metrics
+from multiparser.core.mthread_driver import MultiThreadDriver
+from multiparser.core.request import Request
+from multiparser.core.requests_handler import RequestsHandler
+from multiparser.core.retry import RetryPolicy
+from multiparser.core.speedometer import TokenBucketSpeedometer
+from multiparser.drivers.binance import AsyncBinanceDriver, BinanceDriver
+from multiparser.parsers.binance import BinanceHistoryGetter, INTERVALS_MS
+
+
+def make_requests(n_requests: int, limit: int, interval: str = '1m'):
+    getter = BinanceHistoryGetter()
+    step = INTERVALS_MS[interval] * limit
+    for i in range(n_requests):
+        yield Request(getter, args=('BTCUSDT', interval),
+                      kwargs={'limit': limit, 'startTime': i * step, 'endTime': (i + 1) * step - 1}, weight=2)
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_scenario(url: str, scenario: dict) -> dict:
+    """
+    Parse scenario['requests'] requests from MockExchange at url.
+
+    Returns:
+        dict: scenario measurements.
+    """
+    metrics = Metrics()
+    handler = RequestsHandler(
+        speedometer=TokenBucketSpeedometer(max_speed=scenario['rps'], burst=scenario['burst']),
+        max_memory=scenario['max_memory'],
+        retry_policy=RetryPolicy(max_retries=10, backoff=0.05, max_backoff=1.),
+        metrics=metrics
+    )
+    if scenario['driver'] == 'async':
+        client = AsyncMockClient(url)
+        driver = AsyncMultiDriver(handler, n_workers=scenario['n_workers'],
+                                  driver_constructor=partial(AsyncBinanceDriver, client))
+    elif scenario['client'] == 'worker':
+        client = MockClient(url)
+        driver = MultiThreadDriver(handler, n_workers=scenario['n_workers'],
+                                   driver_constructor=BinanceDriver.pooled(
+                                       partial(MockClient, url, latencies=client.latencies)))
+    else:
+        client = MockClient(url)
+        driver = MultiThreadDriver(handler, n_workers=scenario['n_workers'],
+                                   driver_constructor=partial(BinanceDriver, client))
+
+    cpu_started, started = _cpu_seconds(), time.perf_counter()
+    driver.start()
+    handler.start()
+    n_done = n_failed = rows = 0
+    for request_data in handler.submit(make_requests(scenario['requests'], scenario['limit'])).results():
+        n_done += 1
+        n_failed += request_data.is_failed()
+        rows += sum(len(result.data) for result in request_data.data.values() if result.data is not None)
+    elapsed = time.perf_counter() - started
+    cpu = _cpu_seconds() - cpu_started
+    driver.stop()
+    handler.stop()
+    handler.join()
+
+    snapshot = metrics.snapshot()
+    counters = snapshot['counters']
+    latencies = np.array(client.latencies or [0.])
+    wait = snapshot['histograms'].get('multiparser_limiter_wait_seconds', {'sum': 0.})
+    return {
+        'requests': n_done,
+        'failed': n_failed,
+        'rows': rows,
+        'elapsed_s': elapsed,
+        'rps': n_done / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'cpu_s': cpu,
+        'cpu_share': cpu / elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'limiter_wait_s': wait['sum'],
+        'retries': counters.get('multiparser_retries_total', 0),
+        'http_calls': len(client.latencies),
+    }
+
+
+def _run_in_process(url: str, scenario: dict, results: 'Queue'):
+    results.put(run_scenario(url, scenario))
+
+
+def scenario_name(scenario: dict) -> str:
+    return (f"{scenario['driver']}-{scenario['client']}-w{scenario['n_workers']}-rps{scenario['rps']}"
+            f"-m{scenario['max_memory']}-n{scenario['requests']}")
+
+
+def run(args: 'Namespace') -> dict:
+    exchange = MockExchange(latency=args.latency, rows=args.rows, weight_limit=args.weight_limit,
+                            window=args.window, error_rate=args.error_rate)
+    exchange.start()
+    # every scenario runs in fresh process, so cpu and peak rss are not shared between them
+    context = multiprocessing.get_context('spawn')
+    report = dict()
+    try:
+        for driver, n_workers, rps, max_memory in itertools.product(args.driver, args.n_workers, args.rps,
+                                                                    args.max_memory):
+            scenario = {'driver': driver, 'client': args.client, 'n_workers': n_workers, 'rps': rps,
+                        'burst': args.burst, 'max_memory': max_memory, 'requests': args.requests,
+                        'limit': args.limit}
+            results = context.Queue()
+            process = context.Process(target=_run_in_process, args=(exchange.url, scenario, results))
+            process.start()
+            result = results.get()
+            process.join()
+            name = scenario_name(scenario)
+            report[name] = {'scenario': scenario, **result}
+            print(f"{name}: {result['rps']:.1f} req/s, p50 {result['p50_ms']:.1f}ms, p99 {result['p99_ms']:.1f}ms, "
+                  f"cpu {result['cpu_s']:.2f}s, rss {result['peak_rss_mb']:.0f}MB, "
+                  f"retries {result['retries']}, failed {result['failed']}")
+    finally:
+        exchange.stop()
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> bool:
+    """
+    Print relative change of throughput and tail latency to baseline.
+
+    Returns:
+        bool: True if no scenario regressed more than threshold.
+    """
+    ok = True
+    for name, result in report.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        rps_change = result['rps'] / base['rps'] - 1
+        p99_change = result['p99_ms'] / max(base['p99_ms'], 1e-9) - 1
+        regressed = rps_change < -threshold or p99_change > threshold
+        ok = ok and not regressed
+        print(f"{name}: rps {rps_change:+.1%}, p99 {p99_change:+.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def _ints(value: str) -> list:
+    return [int(item) for item in value.split(',')]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--driver', type=lambda value: value.split(','), help='thread,async', default=['thread'])
+    parser.add_argument('--client', type=str, help='shared or worker, client per worker thread',
+                        default='shared')
+    parser.add_argument('--n_workers', type=_ints, help='comma separated values to sweep', default=[4])
+    parser.add_argument('--rps', type=_ints, help='comma separated values to sweep', default=[200])
+    parser.add_argument('--max_memory', type=_ints, help='comma separated values to sweep', default=[100])
+    parser.add_argument('--burst', type=int, help='speedometer burst', default=10)
+    parser.add_argument('--requests', type=int, help='requests per scenario', default=500)
+    parser.add_argument('--limit', type=int, help='klines per request', default=1000)
+    parser.add_argument('--latency', type=str, help='const:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA',
+                        default='lognormal:0.02:0.5')
+    parser.add_argument('--rows', type=int, help='max rows in response, limit if not set', default=None)
+    parser.add_argument('--weight_limit', type=int, help='server weight per window, 429 above it', default=None)
+    parser.add_argument('--window', type=int, help='server weight window in seconds', default=60)
+    parser.add_argument('--error_rate', type=float, help='share of requests answered with 500', default=0.)
+    parser.add_argument('--out', type=str, help='json file to save results to', default=None)
+    parser.add_argument('--compare', type=str, help='json file of baseline results', default=None)
+    parser.add_argument('--threshold', type=float, help='relative change treated as regression', default=0.1)
+    return parser.parse_args()
+
+
+def main(args: 'Namespace') -> int:
+    report = run(args)
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 0 if compare(report, baseline, args.threshold) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(parse_args()))
@@ -0,0 +1,120 @@
+import time
+from typing import Iterator
+
+from multiparser.backfill.manifest import BackfillManifest
+from multiparser.backfill.planner import RangePlanner
+from multiparser.core.request import Request, RequestData
+from multiparser.parsers.binance import BinanceHistoryGetter
+
+
+class BackfillJob:
+    """
+    Klines backfill resumable from manifest: only ranges not covered by manifest are requested,
+    every completed window is recorded once it is gathered.
+    Gaps are split into the same limit aligned windows as RangePlanner plans, ranges before symbols first
+    candles are skipped if job has requests_handler to probe them through.
+
+    Args:
+        manifest (BackfillManifest): record of covered ranges.
+        symbols (list): symbols to backfill.
+        interval (str): klines interval, e.g. '1m'.
+        start (int): range start, ms.
+        end (int): range end, ms, inclusive.
+
+    Keyword Args:
+        limit (int): candles per request.
+        weight (int): request weight.
+        parser (Parser): klines parser, BinanceHistoryGetter if None.
+        requests_handler (RequestsHandler): started handler to probe first candles through.
+    """
+
+    def __init__(self, manifest: BackfillManifest, symbols: list, interval: str, start: int, end: int,
+                 limit: int = 1000, weight: int = 2, parser: 'Parser' = None,
+                 requests_handler: 'RequestsHandler' = None):
+        self.manifest = manifest
+        self.symbols = symbols
+        self.interval = interval
+        self.start = start
+        self.end = end
+        self.limit = limit
+        self.weight = weight
+        self.parser = parser or BinanceHistoryGetter()
+        self.planner = RangePlanner(requests_handler, interval, limit=limit, weight=weight, parser=self.parser)
+
+        self._first = None
+
+    def first_open_times(self) -> dict:
+        """
+        Returns:
+            dict: RangePlanner.first_open_times of symbols, probed once, empty if job has no requests_handler.
+        """
+        if self._first is None:
+            has_handler = self.planner.requests_handler is not None
+            self._first = self.planner.first_open_times(self.symbols) if has_handler else dict()
+        return self._first
+
+    def starts(self) -> dict:
+        """
+        Returns:
+            dict: (symbol, interval) -> series start, ms. Symbols without history are not in it.
+        """
+        return self.planner.starts(self.symbols, self.start, self.first_open_times())
+
+    def covered(self, symbol: str) -> list:
+        """
+        Returns:
+            list: sorted (start, end) ranges inside [start, end] not requested: covered by manifest
+            or before symbol's first candle.
+        """
+        start = self.starts().get((symbol, self.interval))
+        if start is None:
+            return [(self.start, self.end)]
+        covered, cursor = list(), self.start
+        for gap_start, gap_end in self.manifest.gaps(symbol, self.interval, start, self.end):
+            if gap_start > cursor:
+                covered.append((cursor, gap_start - 1))
+            cursor = gap_end + 1
+        if cursor <= self.end:
+            covered.append((cursor, self.end))
+        return covered
+
+    def requests(self) -> Iterator[Request]:
+        """
+        Requests of windows not covered by manifest. Symbols are probed at once, requests are created lazily.
+        """
+        return self._requests(self.starts())
+
+    def _requests(self, starts: dict) -> Iterator[Request]:
+        for (symbol, interval), start in starts.items():
+            for gap_start, gap_end in self.manifest.gaps(symbol, interval, start, self.end):
+                for window_start, window_end in self.planner.windows(gap_start, gap_end):
+                    yield self.planner.request(symbol, window_start, window_end)
+
+    def record(self, request_data: RequestData):
+        """
+        Mark window of completed container in manifest.
+        Window with not closed candles is not marked, so it is fetched again on restart.
+        """
+        request = request_data.request
+        symbol, interval = request.args[:2]
+        start, end = request.kwargs['startTime'], request.kwargs['endTime']
+        # no payload is not an answer, unlike empty frame of empty range, so it is fetched again
+        if request_data.is_failed() or any(part.data is None for part in request_data.data.values()):
+            status = 'failed'
+        elif self.planner.interval.open_time(self.planner.interval.index(end) + 1) > time.time() * 1000:
+            return
+        elif all(len(part.data) == 0 for part in request_data.data.values()):
+            status = 'empty'
+        else:
+            status = 'done'
+        self.manifest.mark(symbol, interval, start, end, status)
+
+    def run(self, requests_handler: 'RequestsHandler', ordered: bool = False) -> Iterator[RequestData]:
+        """
+        Submit missing windows and yield completed containers, recording them in manifest.
+        """
+        if self.planner.requests_handler is None:
+            self.planner.requests_handler = requests_handler
+        for request_data in requests_handler.submit(self.requests()).results(ordered=ordered):
+            self.record(request_data)
+            yield request_data
@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+import time
+
+
+class BackfillManifest:
+    """
+    Durable record of backfilled (symbol, interval, start, end) ranges, ends are inclusive.
+    Range status is 'done', 'empty' or 'failed'; failed ranges are fetched again on restart.
+
+    Args:
+        path (str): sqlite database path.
+    """
+
+    covered = ('done', 'empty')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS ranges (symbol TEXT, interval TEXT, start INTEGER, end INTEGER, '
+                'status TEXT, updated REAL, PRIMARY KEY (symbol, interval, start, end))')
+
+    def mark(self, symbol: str, interval: str, start: int, end: int, status: str):
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO ranges VALUES (?, ?, ?, ?, ?, ?)',
+                                     (symbol, interval, start, end, status, time.time()))
+
+    def ranges(self, symbol: str, interval: str, statuses: tuple = covered) -> list:
+        """
+        Returns:
+            list: sorted (start, end) ranges with given statuses.
+        """
+        query = (f'SELECT start, end FROM ranges WHERE symbol = ? AND interval = ? '
+                 f'AND status IN ({", ".join("?" * len(statuses))}) ORDER BY start')
+        with self._lock:
+            return self._connection.execute(query, (symbol, interval, *statuses)).fetchall()
+
+    def gaps(self, symbol: str, interval: str, start: int, end: int) -> list:
+        """
+        Returns:
+            list: sorted (start, end) ranges inside [start, end] not covered yet.
+        """
+        gaps = list()
+        cursor = start
+        for range_start, range_end in self.ranges(symbol, interval):
+            if range_end < cursor:
+                continue
+            if range_start > end:
+                break
+            if range_start > cursor:
+                gaps.append((cursor, range_start - 1))
+            cursor = max(cursor, range_end + 1)
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,113 @@
+import heapq
+import itertools
+
+import pandas as pd
+
+from multiparser.core.request import RequestData
+
+
+class _Series:
+    __slots__ = ('heap', 'frontier', 'last_key')
+
+    def __init__(self, frontier: int):
+        self.heap = list()  # (window start, seq, window end, DataFrame | None)
+        self.frontier = frontier  # last time covered by emitted windows
+        self.last_key = None  # last emitted key column value
+
+
+class SeriesMerger:
+    """
+    Merges completed window containers into one sorted deduplicated series per (symbol, interval)
+    as they arrive in any order. Windows are held in heap by start till every window before them is done,
+    then contiguous prefix is emitted, and rows with key not after already emitted ones are dropped,
+    so overlapping window bounds give no duplicates.
+    Memory is proportional to out of order windows, not to the whole range.
+    Ranges no window is requested for, e.g. before late listed symbol's first candle or covered by earlier run,
+    should be passed to cover, otherwise windows after them are held till flush.
+
+    Args:
+        emit (callable): called with (symbol, interval, DataFrame) of every contiguous prefix.
+        start (int): range start, ms, series frontier begins at.
+
+    Keyword Args:
+        key_column (str): sorted unique column to deduplicate by.
+        start_key (str): request kwarg name of window start.
+        end_key (str): request kwarg name of window end, inclusive.
+        on_gap (callable): called with (symbol, interval, start, end) of failed window or missing range
+            emitted past, e.g. to record it.
+    """
+
+    def __init__(self, emit: callable, start: int, key_column: str = 'open_timestamp', start_key: str = 'startTime',
+                 end_key: str = 'endTime', on_gap: callable = None):
+        self.emit = emit
+        self.start = start
+        self.key_column = key_column
+        self.start_key = start_key
+        self.end_key = end_key
+        self.on_gap = on_gap
+
+        self._series = dict()  # (symbol, interval) -> _Series
+        self._seq = itertools.count()
+
+    @property
+    def num_pending(self) -> int:
+        """
+        Windows waiting for windows before them.
+        """
+        return sum(len(series.heap) for series in self._series.values())
+
+    def add(self, request_data: RequestData):
+        """
+        Take completed container, emit prefix it makes contiguous, if any.
+        """
+        request = request_data.request
+        symbol, interval = request.args[:2]
+        start, end = request.kwargs[self.start_key], request.kwargs[self.end_key]
+        if request_data.is_failed():
+            df = None
+            if self.on_gap is not None:
+                self.on_gap(symbol, interval, start, end)
+        else:
+            parts = [request_data.data[part].data for part in sorted(request_data.data)]
+            parts = [part for part in parts if part is not None and len(part)]
+            df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else (parts[0] if parts else None)
+
+        self._push(symbol, interval, start, end, df)
+
+    def cover(self, symbol: str, interval: str, start: int, end: int):
+        """
+        Mark [start, end] range of series as having nothing to emit, windows after it are emitted once ready.
+        """
+        if end >= start:
+            self._push(symbol, interval, start, end, None)
+
+    def _push(self, symbol: str, interval: str, start: int, end: int, df: 'pd.DataFrame | None'):
+        series = self._series.get((symbol, interval))
+        if series is None:
+            series = self._series[(symbol, interval)] = _Series(self.start - 1)
+        heapq.heappush(series.heap, (start, next(self._seq), end, df))
+        self._drain(symbol, interval, series, force=False)
+
+    def _drain(self, symbol: str, interval: str, series: _Series, force: bool):
+        chunks = list()
+        while series.heap and (force or series.heap[0][0] <= series.frontier + 1):
+            start, _, end, df = heapq.heappop(series.heap)
+            if start > series.frontier + 1 and self.on_gap is not None:
+                self.on_gap(symbol, interval, series.frontier + 1, start - 1)
+            series.frontier = max(series.frontier, end)
+            if df is None:
+                continue
+            if series.last_key is not None:
+                df = df[df[self.key_column] > series.last_key]
+            if len(df):
+                series.last_key = df[self.key_column].iloc[-1]
+                chunks.append(df)
+        if chunks:
+            self.emit(symbol, interval, pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0])
+
+    def flush(self):
+        """
+        Emit all pending windows skipping over missing ranges, e.g. once stream is over.
+        """
+        for (symbol, interval), series in self._series.items():
+            self._drain(symbol, interval, series, force=True)
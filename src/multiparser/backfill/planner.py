@@ -0,0 +1,151 @@
+import calendar
+import datetime
+import re
+import time
+from typing import Iterator
+
+from multiparser.core.request import Request
+from multiparser.parsers.binance import BinanceHistoryGetter
+
+_INTERVAL = re.compile(r'(\d+)([smhdwM])')
+_UNITS_MS = {'s': 1000, 'm': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+_WEEK_OFFSET_MS = 4 * 86_400_000  # weekly candles open on Monday, epoch is Thursday
+
+
+class Interval:
+    """
+    Candle interval of any 'Ns', 'Nm', 'Nh', 'Nd', 'Nw' or 'NM' form.
+    Candles are numbered from epoch, so windows of candles are exact for months as well.
+
+    Args:
+        interval (str): e.g. '1m', '4h', '1w', '1M'.
+    """
+
+    def __init__(self, interval: str):
+        match = _INTERVAL.fullmatch(interval)
+        if match is None:
+            raise ValueError(f'unknown interval {interval}')
+        self.interval = interval
+        self.num = int(match.group(1))
+        self.unit = match.group(2)
+        self.offset = _WEEK_OFFSET_MS if self.unit == 'w' else 0
+
+    def index(self, t: int) -> int:
+        """
+        Num of candle open at t ms.
+        """
+        if self.unit == 'M':
+            date = datetime.datetime.fromtimestamp(t / 1000, datetime.timezone.utc)
+            return ((date.year - 1970) * 12 + date.month - 1) // self.num
+        return (t - self.offset) // (self.num * _UNITS_MS[self.unit])
+
+    def open_time(self, index: int) -> int:
+        """
+        Open time of candle index, ms.
+        """
+        if self.unit == 'M':
+            year, month = divmod(index * self.num, 12)
+            return calendar.timegm((1970 + year, month + 1, 1, 0, 0, 0)) * 1000
+        return index * self.num * _UNITS_MS[self.unit] + self.offset
+
+    def __repr__(self) -> str:
+        s = f'{self.__class__.__name__}[{self.interval}]'
+        return s
+
+
+class RangePlanner:
+    """
+    Plans klines windows of exactly `limit` candles aligned to epoch, so the same windows are requested
+    on every run, starting from symbol's first candle and stopping at current one.
+    First candles are found by one probe per symbol: klines with startTime=0 and limit=1
+    answer the earliest candle there is, empty answer means symbol has no history.
+
+    Args:
+        requests_handler (RequestsHandler): started handler to probe through.
+        interval (str): klines interval, e.g. '1m'.
+
+    Keyword Args:
+        limit (int): candles per request.
+        weight (int): request weight.
+        parser (Parser): klines parser, BinanceHistoryGetter if None.
+    """
+
+    def __init__(self, requests_handler: 'RequestsHandler', interval: str, limit: int = 1000, weight: int = 2,
+                 parser: 'Parser' = None):
+        self.requests_handler = requests_handler
+        self.interval = Interval(interval)
+        self.limit = limit
+        self.weight = weight
+        self.parser = parser or BinanceHistoryGetter()
+
+    def first_open_times(self, symbols: list) -> dict:
+        """
+        Probe symbols in parallel.
+
+        Returns:
+            dict: symbol -> first candle open time, ms, None if symbol has no candles.
+            Symbols probe failed for or returned nothing are not in it.
+        """
+        probes = [Request(self.parser, args=(symbol, self.interval.interval), kwargs={'startTime': 0, 'limit': 1},
+                          weight=1) for symbol in symbols]
+        first = dict()
+        for request_data in self.requests_handler.submit(probes).results():
+            df = request_data.data[0].data
+            if request_data.is_failed() or df is None:
+                continue
+            first[request_data.request.args[0]] = int(df['open_timestamp'].iloc[0]) if len(df) else None
+        return first
+
+    def windows(self, start: int, end: int) -> Iterator[tuple]:
+        """
+        Windows of [start, end] range, ms, aligned to `limit` candles boundaries, clipped to current candle.
+
+        Returns:
+            Iterator[tuple]: (start, end) of window, ms, inclusive.
+        """
+        end = min(end, int(time.time() * 1000))
+        if end < start:
+            return
+        first, last = self.interval.index(start), self.interval.index(end)
+        for window in range(first // self.limit, last // self.limit + 1):
+            window_first = max(window * self.limit, first)
+            window_last = min((window + 1) * self.limit - 1, last)
+            yield (max(self.interval.open_time(window_first), start),
+                   min(self.interval.open_time(window_last + 1) - 1, end))
+
+    def starts(self, symbols: list, start: int, first: dict) -> dict:
+        """
+        Start of every planned series: range start, or symbol's first candle if it is later.
+
+        Args:
+            first (dict): first_open_times of symbols.
+
+        Returns:
+            dict: (symbol, interval) -> start, ms. Symbols without history are not in it.
+        """
+        return {(symbol, self.interval.interval): max(start, first.get(symbol) or start) for symbol in symbols
+                if not (symbol in first and first[symbol] is None)}
+
+    def requests(self, symbols: list, start: int, end: int, first: dict = None) -> Iterator[Request]:
+        """
+        Requests of symbols windows, ranges before first candles and symbols without history are skipped.
+        Symbols are probed at once if first is None, requests are created lazily.
+
+        Args:
+            first (dict): first_open_times of symbols, if probed already.
+        """
+        if first is None:
+            first = self.first_open_times(symbols)
+        return self._requests(self.starts(symbols, start, first), end)
+
+    def request(self, symbol: str, start: int, end: int) -> Request:
+        """
+        Request of single window, ms, inclusive.
+        """
+        return Request(self.parser, args=(symbol, self.interval.interval),
+                       kwargs={'limit': self.limit, 'startTime': start, 'endTime': end}, weight=self.weight)
+
+    def _requests(self, starts: dict, end: int) -> Iterator[Request]:
+        for (symbol, _), start in starts.items():
+            for window_start, window_end in self.windows(start, end):
+                yield self.request(symbol, window_start, window_end)
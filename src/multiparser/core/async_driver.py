@@ -0,0 +1,151 @@
+import asyncio
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+from multiparser.core.requests_handler import RequestsHandler
+from multiparser.core.single_driver import SingleDriverBase
+
+
+class AsyncSingleDriverBase(SingleDriverBase):
+    """
+    Base class for single async parser. Runs as coroutine on AsyncMultiDriver event loop.
+
+    Args:
+        worker_num (int): Worker num
+        requests_handler (RequestHandler): handler to execute requests.
+        lock (Lock): not used, kept for constructors compatibility.
+    """
+
+    def __init__(self, worker_num: int, requests_handler: 'RequestsHandler', lock: 'Lock' = None):
+        super().__init__(worker_num, requests_handler, lock)
+
+    async def async_worker(self, inbox: asyncio.Queue):
+        # setup is called by AsyncMultiDriver before workers start
+        try:
+            await self._async_work(inbox)
+        finally:
+            self.teardown()
+
+    async def _async_work(self, inbox: asyncio.Queue):
+        while True:
+            req = await inbox.get()
+            if req is None:  # stop sentinel
+                break
+            if req.resolved:  # hedge of request answered already
+                continue
+
+            started = time.perf_counter()
+            delay = self.speedometer.reserve(req.weight)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent = time.perf_counter()
+            self.metrics.observe('multiparser_limiter_wait_seconds', sent - started)
+
+            # coroutine is cancelled on timeout, so no watchdog is needed
+            tracking = self._requests_handler.track(req, watchdog=False)
+            self._children = list()
+            try:
+                parsed_data = req(self)
+                if inspect.isawaitable(parsed_data):
+                    parsed_data = await asyncio.wait_for(parsed_data, self._requests_handler.timeout_of(req))
+            except Exception as e:
+                self._children = None
+                self._count(started, sent)
+                if self._requests_handler.untrack(req, tracking) and not self.handle_error(req, e):
+                    self._requests_handler.put_result(req, None, e)
+                continue
+
+            children, self._children = self._children, None
+            self._count(started, sent)
+            self._requests_handler.untrack(req, tracking)
+            self._requests_handler.put_result(req, parsed_data, children=children)
+
+    def start(self):
+        pass
+
+    def signal_stop(self, wake: bool = True):
+        self._done = True
+
+    def join(self, timeout: float = None) -> bool:
+        return True
+
+
+class AsyncMultiDriver:
+    """
+    Runs n_workers coroutine drivers on single event loop in a dedicated thread.
+    Requests are taken from the same RequestsHandler as MultiThreadDriver uses.
+
+    Args:
+        request_handler (RequestsHandler): handler to execute requests.
+        n_workers (int): N coroutines to create.
+        driver_constructor (callable): AsyncSingleDriverBase constructor.
+    """
+
+    def __init__(self, request_handler: 'RequestsHandler', n_workers=100,
+                 driver_constructor: callable = AsyncSingleDriverBase):
+        self._n_workers = n_workers
+        self.request_handler = request_handler
+        self.driver_constructor = driver_constructor
+
+        self._workers = list()
+        self._done = False
+        self._working_thread = None
+        self._bridge = None
+
+    def _start_workers(self) -> 'Exception | None':
+        """
+        Returns:
+            Exception: error workers failed to be created or set up with, None if all are started.
+        """
+        self._workers = list()
+        try:
+            for n_worker in range(self._n_workers):
+                worker = self.driver_constructor(n_worker, self.request_handler)
+                worker.setup()
+                self._workers.append(worker)
+        except Exception as e:
+            print(f'AsyncMultiDriver caught {e!r} on workers start, requests are failed with it')
+            for worker in self._workers:
+                worker.teardown()
+            self._workers = list()
+            return e
+        return None
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        inbox = asyncio.Queue(maxsize=self._n_workers)
+        error = self._start_workers()
+        tasks = [loop.create_task(worker.async_worker(inbox)) for worker in self._workers]
+
+        # blocking requests queue is read by single bridge thread
+        with ThreadPoolExecutor(max_workers=1) as self._bridge:
+            while not self._done:
+                req = await loop.run_in_executor(self._bridge, self.request_handler.requests_to_do.get)
+                if req is None or req.resolved:
+                    continue
+                if error is not None:
+                    # no workers to execute request, so it is failed instead of waiting forever
+                    self.request_handler.put_result(req, None, error)
+                else:
+                    await inbox.put(req)
+
+        for _ in tasks:
+            await inbox.put(None)
+        await asyncio.gather(*tasks)
+
+    def start(self):
+        print('AsyncMultiDriver started')
+        self._done = False
+        self._working_thread = Thread(target=asyncio.run, args=(self._main(),))
+        self._working_thread.start()
+
+    def stop(self):
+        print('AsyncMultiDriver stopped')
+        self._done = True
+        self.request_handler.requests_to_do.put(None)
+        self.join()
+
+    def join(self):
+        self._working_thread.join()
@@ -0,0 +1,131 @@
+import collections
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any
+
+
+def request_key(req: 'Request') -> str:
+    """
+    Key of request by parser identity and normalized args / kwargs.
+    Parser identity is its 'cache_namespace' attribute or its class qualified name.
+    """
+    parser = req.parser
+    identity = getattr(parser, 'cache_namespace', None)
+    if identity is None:
+        owner = parser if callable(parser) and hasattr(parser, '__qualname__') else type(parser)
+        identity = f'{owner.__module__}.{owner.__qualname__}'
+    payload = json.dumps([identity, list(req.args), req.kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class MemoryCache:
+    """
+    In memory LRU tier.
+
+    Args:
+        maxsize (int): max amount of entries.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> 'tuple | None':
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, value: Any, expires: float):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class SqliteCache:
+    """
+    On disk tier, values are pickled.
+
+    Args:
+        path (str): sqlite database path.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+
+    def get(self, key: str) -> 'tuple | None':
+        with self._lock:
+            row = self._connection.execute('SELECT value, expires FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return pickle.loads(row[0]), row[1]
+
+    def put(self, key: str, value: Any, expires: float):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (key, blob, expires))
+
+    def close(self):
+        self._connection.close()
+
+
+class ResponseCache:
+    """
+    Cache of raw parser data with in memory LRU tier before on disk one.
+    Lifetime of entry is given by parser's cache_ttl(request, *args, **kwargs):
+    None - not cached, float('inf') - cached forever.
+
+    Args:
+        path (str): sqlite database path, memory only if None.
+        maxsize (int): max amount of entries in memory.
+    """
+
+    def __init__(self, path: str = None, maxsize: int = 1024):
+        self.tiers = [MemoryCache(maxsize)]
+        if path is not None:
+            self.tiers.append(SqliteCache(path))
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, req: 'Request') -> tuple:
+        """
+        Returns:
+            tuple: (hit, value).
+        """
+        key = request_key(req)
+        for idx, tier in enumerate(self.tiers):
+            entry = tier.get(key)
+            if entry is not None:
+                # promote to faster tiers
+                for upper_tier in self.tiers[:idx]:
+                    upper_tier.put(key, *entry)
+                self.hits += 1
+                return True, entry[0]
+        self.misses += 1
+        return False, None
+
+    def put(self, req: 'Request', value: Any):
+        cache_ttl = getattr(req.parser, 'cache_ttl', None)
+        ttl = None if cache_ttl is None else cache_ttl(req, *req.args, **req.kwargs)
+        if not ttl:
+            return
+        key = request_key(req)
+        for tier in self.tiers:
+            tier.put(key, value, time.time() + ttl)
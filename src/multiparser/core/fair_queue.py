@@ -0,0 +1,90 @@
+import heapq
+import itertools
+from queue import Queue
+
+from multiparser.core.speedometer import cost_of
+
+
+class _PriorityClass:
+    """
+    Requests of single priority: with deadline ones earliest deadline first, then the rest
+    in self-clocked weighted fair queuing order of tenants.
+    """
+
+    __slots__ = ('deadlines', 'fair', 'virtual_time', 'last_finish')
+
+    def __init__(self):
+        self.deadlines = list()  # heap of (deadline, seq, request)
+        self.fair = list()  # heap of (finish tag, seq, request)
+        self.virtual_time = 0.
+        self.last_finish = dict()  # tenant -> finish tag of its last queued request
+
+    def put(self, req: 'Request', share: float, seq: int):
+        if req.deadline is not None:
+            heapq.heappush(self.deadlines, (req.deadline, seq, req))
+            return
+        start = max(self.virtual_time, self.last_finish.get(req.tenant, 0.))
+        finish = start + cost_of(req.weight, 'weight') / share
+        self.last_finish[req.tenant] = finish
+        heapq.heappush(self.fair, (finish, seq, req))
+
+    def get(self) -> 'Request':
+        if self.deadlines:
+            return heapq.heappop(self.deadlines)[2]
+        finish, _, req = heapq.heappop(self.fair)
+        self.virtual_time = finish
+        return req
+
+    def __len__(self) -> int:
+        return len(self.deadlines) + len(self.fair)
+
+
+class FairQueue(Queue):
+    """
+    Requests to do queue serving by Request.priority class first, then by earliest Request.deadline,
+    then sharing budget between Request.tenant jobs in proportion to their weights.
+    It only decides which request takes next speedometer slot, so all jobs use one rate budget
+    and an idle job's share goes to the others.
+    Stop sentinel None is served before any request.
+
+    Submit bulk jobs with window below handler max_memory, so urgent requests find free containers.
+
+    Args:
+        weights (dict): tenant -> share weight, 1 for tenants not listed.
+        maxsize (int): max requests in queue, unlimited if 0.
+    """
+
+    def __init__(self, weights: dict = None, maxsize: int = 0):
+        self.weights = weights or dict()
+        super().__init__(maxsize)
+
+    def _init(self, maxsize: int):
+        self._classes = dict()  # priority -> _PriorityClass
+        self._size = 0
+        self._sentinels = 0
+        self._seq = itertools.count()
+
+    def _qsize(self) -> int:
+        return self._size + self._sentinels
+
+    def _put(self, req: 'Request'):
+        if req is None:
+            self._sentinels += 1
+            return
+        priority_class = self._classes.get(req.priority)
+        if priority_class is None:
+            priority_class = self._classes[req.priority] = _PriorityClass()
+        priority_class.put(req, self.weights.get(req.tenant, 1), next(self._seq))
+        self._size += 1
+
+    def _get(self) -> 'Request':
+        if self._sentinels:
+            self._sentinels -= 1
+            return None
+        priority = min(self._classes)
+        priority_class = self._classes[priority]
+        req = priority_class.get()
+        if not priority_class:
+            del self._classes[priority]
+        self._size -= 1
+        return req
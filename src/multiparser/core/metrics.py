@@ -0,0 +1,233 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+
+
+def _key(name: str, labels: dict = None) -> str:
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Histogram:
+    """
+    Fixed buckets histogram.
+
+    buckets (tuple): upper bounds of buckets, +inf bucket is added.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of bucket q-quantile falls into.
+        """
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            if total >= rank and total:
+                return bound
+        return 0.
+
+    def to_dict(self) -> dict:
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'sum': self.sum, 'count': self.count,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+
+class NullMetrics:
+    """
+    Metrics collection disabled, every call is a no-op.
+    """
+
+    enabled = False
+
+    def inc(self, name: str, value: float = 1, labels: dict = None):
+        pass
+
+    def set(self, name: str, value: float, labels: dict = None):
+        pass
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        pass
+
+    def gauge_fn(self, name: str, fn: callable, labels: dict = None):
+        pass
+
+    def snapshot(self) -> dict:
+        return {'timestamp': time.time(), 'counters': {}, 'gauges': {}, 'histograms': {}}
+
+
+class Metrics(NullMetrics):
+    """
+    Registry of counters, gauges and histograms collected in core.
+    Gauges registered with gauge_fn are evaluated on snapshot only.
+
+    Args:
+        buckets (tuple): histograms buckets upper bounds.
+    """
+
+    enabled = True
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = dict()
+        self._gauges = dict()
+        self._gauge_fns = dict()
+        self._histograms = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, labels: dict = None):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, labels: dict = None):
+        self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def gauge_fn(self, name: str, fn: callable, labels: dict = None):
+        self._gauge_fns[_key(name, labels)] = fn
+
+    def snapshot(self) -> dict:
+        gauges = {key: fn() for key, fn in list(self._gauge_fns.items())}
+        with self._lock:
+            gauges.update(self._gauges)
+            return {
+                'timestamp': time.time(),
+                'counters': dict(self._counters),
+                'gauges': gauges,
+                'histograms': {key: histogram.to_dict() for key, histogram in self._histograms.items()},
+            }
+
+
+def to_prometheus(snapshot: dict) -> str:
+    """
+    Render snapshot in prometheus text exposition format.
+    """
+    lines = list()
+    for key, value in sorted(snapshot['counters'].items()):
+        lines.append(f'{key} {value}')
+    for key, value in sorted(snapshot['gauges'].items()):
+        lines.append(f'{key} {value}')
+    for key, histogram in sorted(snapshot['histograms'].items()):
+        name, _, labels = key.partition('{')
+        labels = labels.rstrip('}')
+        total = 0
+        for bound, count in zip(histogram['buckets'] + ['+Inf'], histogram['counts']):
+            total += count
+            bucket_labels = ','.join(filter(None, [labels, f'le="{bound}"']))
+            lines.append(f'{name}_bucket{{{bucket_labels}}} {total}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {histogram["sum"]}')
+        lines.append(f'{name}_count{suffix} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class CallbackExporter:
+    """
+    Args:
+        callback (callable): called with snapshot dict.
+    """
+
+    def __init__(self, callback: callable):
+        self.callback = callback
+
+    def export(self, snapshot: dict):
+        self.callback(snapshot)
+
+
+class PrometheusTextFileExporter:
+    """
+    Writes snapshot for node exporter textfile collector.
+
+    Args:
+        path (str): *.prom file path.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, snapshot: dict):
+        _write_atomic(self.path, to_prometheus(snapshot))
+
+
+class JsonSnapshotExporter:
+    """
+    Args:
+        path (str): json file path.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, snapshot: dict):
+        _write_atomic(self.path, json.dumps(snapshot, indent=2))
+
+
+class MetricsReporter:
+    """
+    Exports metrics snapshot every interval seconds and once on stop.
+
+    Args:
+        metrics (Metrics): registry to export.
+        exporters (list): exporters with export(snapshot) method.
+        interval (float): seconds between exports.
+    """
+
+    def __init__(self, metrics: Metrics, exporters: list, interval: float = 10.):
+        self.metrics = metrics
+        self.exporters = exporters
+        self.interval = interval
+
+        self._stop_event = threading.Event()
+        self._working_thread = None
+
+    def export(self):
+        snapshot = self.metrics.snapshot()
+        for exporter in self.exporters:
+            try:
+                exporter.export(snapshot)
+            except Exception as e:
+                print(f'MetricsReporter caught {e}')
+
+    def thread_worker(self):
+        while not self._stop_event.wait(self.interval):
+            self.export()
+        self.export()
+
+    def start(self):
+        self._stop_event.clear()
+        self._working_thread = threading.Thread(target=self.thread_worker, daemon=True)
+        self._working_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._working_thread.join()
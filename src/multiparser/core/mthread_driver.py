@@ -1,42 +1,151 @@
+import math
 import threading
+import time
 
 from multiparser.core.requests_handler import RequestsHandler
 from multiparser.core.single_driver import SingleDriverBase
 
+_ALPHA = 0.3  # weight of last interval in latency and wait averages
+
 
 class MultiThreadDriver:
+    """
+    Args:
+        request_handler (RequestsHandler): handler to execute requests.
+        n_workers (int): N threads to create, initial amount if autoscale.
+        driver_constructor (callable): SingleDriverBase constructor.
+
+    Keyword Args:
+        autoscale (bool): add and remove workers at runtime to keep speedometer budget busy
+            with the fewest threads.
+        min_workers (int): lower bound of autoscaling.
+        max_workers (int): upper bound of autoscaling.
+        scale_interval (float): seconds between autoscaling decisions.
+    """
+
     def __init__(self, request_handler: 'RequestsHandler', n_workers=1,
-                 driver_constructor: callable = SingleDriverBase):
+                 driver_constructor: callable = SingleDriverBase, autoscale: bool = False, min_workers: int = 1,
+                 max_workers: int = 64, scale_interval: float = 1.):
         self._n_workers = n_workers
         self.request_handler = request_handler
         self.driver_constructor = driver_constructor
+        self.autoscale = autoscale
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.scale_interval = scale_interval
 
         self._workers = list()
+        self._stopping = list()  # removed by autoscaling, joined on stop
+        self._next_worker_num = 0
         self._done = False
         self._working_thread = None
         self.lock = threading.Lock()
 
+        self.latency_ewma = None
+        self.wait_ewma = None
+
+    @property
+    def n_workers(self) -> int:
+        return len(self._workers)
+
+    def add_worker(self):
+        worker = self.driver_constructor(self._next_worker_num, self.request_handler, self.lock)
+        self._next_worker_num += 1
+        worker.start()
+        self._workers.append(worker)
+
+    def remove_worker(self):
+        worker = self._workers.pop()
+        worker.signal_stop()
+        self._stopping.append(worker)
+
     def spawn_workers(self):
         # spawning single drivers
-        for n_worker in range(self._n_workers):
-            worker = self.driver_constructor(n_worker, self.request_handler, self.lock)
-            worker.start()
-            self._workers.append(worker)
+        for _ in range(self._n_workers):
+            self.add_worker()
 
     def kill_workers(self):
-        for idx, worker in enumerate(self._workers):
-            worker.stop()
+        # mark all workers first, so sentinel taken by any of them stops it, then wake them up
+        workers = self._workers + self._stopping
+        for worker in self._workers:
+            worker.signal_stop(wake=False)
+        for _ in workers:
+            self.request_handler.requests_to_do.put(None)
+        for worker in workers:
+            # worker stuck in call past its timeout may never return, it is left behind
+            while not worker.join(timeout=0.1):
+                if worker.is_abandoned:
+                    print(f'MultiThreadDriver left worker {worker._worker_num} in timed out call')
+                    break
+        self._workers = list()
+        self._stopping = list()
+
+    def _totals(self) -> tuple:
+        workers = self._workers + self._stopping
+        return (sum(worker.num_done for worker in workers), sum(worker.wait_time for worker in workers),
+                sum(worker.busy_time for worker in workers))
+
+    def target_workers(self, throughput: float, queue_depth: int) -> int:
+        """
+        Workers needed by Little's law: throughput * latency, plus 10% spare.
+        While there is backlog and workers hardly wait for speedometer, budget is not saturated,
+        so pool grows by half.
+
+        Args:
+            throughput (float): requests done per second.
+            queue_depth (int): requests waiting for worker.
+        """
+        n = self.n_workers
+        if self.latency_ewma is None:
+            return n
+        if queue_depth > 0 and self.wait_ewma < 0.05 * self.latency_ewma:
+            target = n + max(1, n // 2)
+        else:
+            needed = throughput * self.latency_ewma
+            target = math.ceil(needed * 1.1) + 1
+        return max(self.min_workers, min(self.max_workers, target))
+
+    def thread_worker(self):
+        prev_done, prev_wait, prev_busy = self._totals()
+        prev_time = time.perf_counter()
+        while not self._done:
+            time.sleep(self.scale_interval)
+            if self._done:
+                break
+            done, wait, busy = self._totals()
+            now = time.perf_counter()
+            n_done = done - prev_done
+            if n_done:
+                latency, waited = (busy - prev_busy) / n_done, (wait - prev_wait) / n_done
+                if self.latency_ewma is None:
+                    self.latency_ewma, self.wait_ewma = latency, waited
+                else:
+                    self.latency_ewma = _ALPHA * latency + (1 - _ALPHA) * self.latency_ewma
+                    self.wait_ewma = _ALPHA * waited + (1 - _ALPHA) * self.wait_ewma
+            throughput = n_done / (now - prev_time)
+            prev_done, prev_wait, prev_busy, prev_time = done, wait, busy, now
+
+            target = self.target_workers(throughput, self.request_handler.requests_to_do.qsize())
+            while self.n_workers < target:
+                self.add_worker()
+            while self.n_workers > target:
+                self.remove_worker()
+            self.request_handler.metrics.set('multiparser_workers', self.n_workers)
 
     def start(self):
         print('MultiThreadParser started')
-        self.spawn_workers()
         self._done = False
+        self.spawn_workers()
+        if self.autoscale:
+            self._working_thread = threading.Thread(target=self.thread_worker, daemon=True)
+            self._working_thread.start()
 
     def stop(self):
         print('MultiThreadParser stopped')
         self._done = True
+        if self._working_thread is not None:
+            self._working_thread.join()
         self.kill_workers()
-        # self.join()
 
     def join(self):
         self._working_thread.join()
@@ -9,3 +9,27 @@ class Parser(abc.ABC):
     @abc.abstractmethod
     def __call__(self, single_driver: SingleDriverBase, request: Request, *args, **kwargs) -> Any:
         pass
+
+    def postprocess(self, data: Any) -> Any:
+        """
+        CPU heavy transform of raw data returned by __call__.
+        Runs in worker thread or in ProcessPoolStage if handler has one, so parser should be picklable.
+        """
+        return data
+
+    def cache_ttl(self, request: Request, *args, **kwargs) -> 'float | None':
+        """
+        Seconds raw data of request may be cached for, float('inf') if it never changes.
+        Not cached if None.
+        """
+        return None
+
+
+class AsyncParser(Parser):
+    """
+    Parser for AsyncSingleDriverBase, called on event loop.
+    """
+
+    @abc.abstractmethod
+    async def __call__(self, single_driver: 'AsyncSingleDriverBase', request: Request, *args, **kwargs) -> Any:
+        pass
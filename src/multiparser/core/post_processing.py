@@ -0,0 +1,56 @@
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Any
+
+from multiparser.core.request import Result
+
+
+def _postprocess(parser: 'Parser', data: Any) -> Any:
+    return parser.postprocess(data)
+
+
+class ProcessPoolStage:
+    """
+    Pipeline stage to run Parser.postprocess in separate processes,
+    so CPU heavy parsing does not hold GIL on I/O workers.
+
+    Args:
+        max_workers (int): num of processes, os.cpu_count() if None.
+        mp_context (BaseContext): multiprocessing context for pool, forkserver or spawn if None.
+            Pool processes start on first submit, while driver threads hold locks, so fork is not used by default.
+    """
+
+    def __init__(self, max_workers: int = None, mp_context: 'BaseContext' = None):
+        self._max_workers = max_workers
+        if mp_context is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            mp_context = multiprocessing.get_context(method)
+        self._mp_context = mp_context
+        self._executor = None
+
+    def submit(self, req: 'Request', data: Any, callback: callable):
+        """
+        Args:
+            req (Request): request data is received for.
+            data (Any): raw data to postprocess.
+            callback (callable): called with Result of processed data.
+        """
+        future = self._executor.submit(_postprocess, req.parser, data)
+        future.add_done_callback(partial(self._on_done, req, callback))
+
+    @staticmethod
+    def _on_done(req: 'Request', callback: callable, future: Future):
+        error = None
+        try:
+            data = future.result()
+        except Exception as e:
+            print(f'ProcessPoolStage caught {e}')
+            data, error = None, e
+        callback(Result(req, data, error))
+
+    def start(self):
+        self._executor = ProcessPoolExecutor(max_workers=self._max_workers, mp_context=self._mp_context)
+
+    def stop(self):
+        self._executor.shutdown(wait=True)
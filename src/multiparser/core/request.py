@@ -1,9 +1,10 @@
-from typing import Any
+from typing import Any, Iterator
 
 
 class Request:
     """
-    Base class for Request.
+    Base class for Request. Uses __slots__ to keep millions of queued requests compact,
+    subclasses adding attributes should declare own __slots__.
 
     parent_idx (int): Inner request idx.
     args (tuple): passed on call to parser
@@ -17,16 +18,37 @@ class Request:
         kwargs (dict): passed on call to parser
         total_parts (int): total requests to fill RequestData.
         current_part (int): current idx of request.
+        weight (int | dict): rate limit budget consumed by request, or mapping kind -> amount.
+        retry_policy (RetryPolicy): policy on failure, parser's or handler's one is used if None.
+        priority (int): priority class for FairQueue, lower is served first.
+        tenant (str): job sharing rate budget with others in FairQueue.
+        deadline (float): unix time request is wanted by, served earliest deadline first in its priority class.
+        shard (str): name of Shard to execute request on, e.g. endpoint available for single key only.
+        timeout (float): seconds single attempt may take, handler's default is used if None.
     """
 
+    __slots__ = ('container_idx', 'parser', 'args', 'kwargs', 'total_parts', 'current_part', 'weight',
+                 'retry_policy', 'attempt', 'priority', 'tenant', 'deadline', 'shard', 'timeout', 'resolved')
+
     def __init__(self, parser: 'Parser', args: tuple = None, kwargs: dict = None, total_parts: int = 1,
-                 current_part: int = 0, **__):
+                 current_part: int = 0, weight: 'int | dict' = 1, retry_policy: 'RetryPolicy' = None,
+                 priority: int = 0, tenant: str = None, deadline: float = None, shard: str = None,
+                 timeout: float = None, **__):
         self.container_idx = None  # idx of container to store data.
         self.parser = parser
         self.args = args or tuple()
         self.kwargs = kwargs or dict()
         self.total_parts = total_parts
         self.current_part = current_part
+        self.weight = weight
+        self.retry_policy = retry_policy
+        self.attempt = 0  # num of retries done.
+        self.priority = priority
+        self.tenant = tenant
+        self.deadline = deadline
+        self.shard = shard
+        self.timeout = timeout
+        self.resolved = False  # result is published, other executions of request are discarded.
 
     def is_last(self) -> bool:
         return self.total_parts == self.current_part + 1
@@ -34,31 +56,151 @@ class Request:
     def __call__(self, single_driver: 'SingleDriverBase') -> Any:
         return self.parser(single_driver, self, *self.args, **self.kwargs)
 
+    def child(self, args: tuple = None, kwargs: dict = None) -> 'Request':
+        """
+        Request with the same parser, weight and scheduling, to be added with SingleDriverBase.add_child_request.
+
+        Args:
+            args (tuple): parser args, same as parent's if None.
+            kwargs (dict): parser kwargs, same as parent's if None.
+        """
+        return Request(self.parser, args=self.args if args is None else args,
+                       kwargs=self.kwargs if kwargs is None else kwargs, weight=self.weight,
+                       retry_policy=self.retry_policy, priority=self.priority, tenant=self.tenant,
+                       deadline=self.deadline, shard=self.shard, timeout=self.timeout)
+
+    def postprocess(self, data: Any) -> Any:
+        postprocess = getattr(self.parser, 'postprocess', None)
+        return data if postprocess is None else postprocess(data)
+
     def __repr__(self) -> str:
         s = f'{self.__class__.__name__}[{self.args}, {self.kwargs}]'
         return s
 
 
+class RangeRequest:
+    """
+    Bulk request over [start, end] range, lazily expanded into Request per window,
+    so whole range is stored as a single object until it is submitted.
+
+    Args:
+        parser (Parser):
+        start (int): range start.
+        end (int): range end, inclusive.
+        step (int): window length.
+
+    Keyword Args:
+        args (tuple): passed on call to parser
+        kwargs (dict): passed on call to parser along with window bounds.
+        start_key (str): kwarg name of window start.
+        end_key (str): kwarg name of window end.
+        weight (int | dict): weight of every window request.
+        retry_policy (RetryPolicy): policy of every window request.
+        priority (int): priority class of every window request.
+        tenant (str): tenant of every window request.
+        deadline (float): deadline of every window request.
+        shard (str): shard every window request is pinned to.
+        timeout (float): timeout of every window request attempt.
+    """
+
+    __slots__ = ('parser', 'start', 'end', 'step', 'args', 'kwargs', 'start_key', 'end_key', 'weight',
+                 'retry_policy', 'priority', 'tenant', 'deadline', 'shard', 'timeout')
+
+    def __init__(self, parser: 'Parser', start: int, end: int, step: int, args: tuple = None, kwargs: dict = None,
+                 start_key: str = 'startTime', end_key: str = 'endTime', weight: 'int | dict' = 1,
+                 retry_policy: 'RetryPolicy' = None, priority: int = 0, tenant: str = None, deadline: float = None,
+                 shard: str = None, timeout: float = None):
+        self.parser = parser
+        self.start = start
+        self.end = end
+        self.step = step
+        self.args = args or tuple()
+        self.kwargs = kwargs or dict()
+        self.start_key = start_key
+        self.end_key = end_key
+        self.weight = weight
+        self.retry_policy = retry_policy
+        self.priority = priority
+        self.tenant = tenant
+        self.deadline = deadline
+        self.shard = shard
+        self.timeout = timeout
+
+    def __len__(self) -> int:
+        return max(0, (self.end - self.start) // self.step + 1)
+
+    def __iter__(self) -> Iterator[Request]:
+        for window_start in range(self.start, self.end + 1, self.step):
+            kwargs = {**self.kwargs, self.start_key: window_start,
+                      self.end_key: min(window_start + self.step - 1, self.end)}
+            yield Request(self.parser, args=self.args, kwargs=kwargs, weight=self.weight,
+                          retry_policy=self.retry_policy, priority=self.priority, tenant=self.tenant,
+                          deadline=self.deadline, shard=self.shard, timeout=self.timeout)
+
+    def __repr__(self) -> str:
+        s = f'{self.__class__.__name__}[{self.args}, {self.kwargs}, {self.start}..{self.end} by {self.step}]'
+        return s
+
+
+class Result:
+    """
+    Result of single request execution. Supports item access as a dict of the same keys.
+
+    Args:
+        request (Request): executed request.
+        data (Any): received data.
+        error (Exception): exception request failed with, if any.
+    """
+
+    __slots__ = ('request', 'data', 'error')
+
+    def __init__(self, request: Request, data: Any = None, error: Exception = None):
+        self.request = request
+        self.data = data
+        self.error = error
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def __repr__(self) -> str:
+        s = f'{self.__class__.__name__}[{self.request}, error={self.error!r}]'
+        return s
+
+
 class RequestData:
     """
     Container for data received.
+
+    Args:
+        request (Request): request container was created for.
     """
 
-    def __init__(self):
-        self.total_parts = 1
+    __slots__ = ('request', 'total_parts', 'parts_done', 'data')
+
+    def __init__(self, request: 'Request' = None):
+        self.request = request
+        self.total_parts = 1  # grows with child requests added while parsing.
         self.parts_done = 0
         self.data = dict()
 
-    def add_data(self, job_result: dict):
-        req = job_result['request']
-        data = job_result['data']
-        if req.is_last():
-            self.total_parts = req.total_parts
-        self.data[req.current_part] = {'data': data, 'request': req}
+    def add_data(self, result: Result):
+        self.request = self.request or result.request
+        self.data[result.request.current_part] = result
         self.parts_done += 1
 
     def is_completed(self) -> bool:
-        return self.total_parts >= self.parts_done
+        return self.parts_done >= self.total_parts
+
+    @property
+    def errors(self) -> dict:
+        """
+        Returns:
+            dict: part idx -> exception for failed parts.
+        """
+        return {part: result.error for part, result in self.data.items() if result.error is not None}
+
+    def is_failed(self) -> bool:
+        return bool(self.errors)
 
     def __repr__(self) -> str:
         s = f'{self.__class__.__name__}:[\n{self.data}\n]\n[{self.parts_done}/{self.total_parts} parts done]'
@@ -1,11 +1,17 @@
+import collections
 import time
-
-from queue import Queue
-from threading import Thread
+from queue import Empty, Queue
+from threading import Condition, Lock, Thread
+from functools import partial
+from typing import Any, Iterable
 
 from multiparser.custom_exceptions.cex import MaxMemoryLimit
-from multiparser.core.request import RequestData
+from multiparser.core.cache import request_key
+from multiparser.core.metrics import NullMetrics
+from multiparser.core.request import RequestData, Result
+from multiparser.core.scheduler import Scheduler
 from multiparser.core.speedometer import Speedometer
+from multiparser.core.stream import RequestStream
 
 
 class _InnerQ:
@@ -13,47 +19,192 @@ class _InnerQ:
     Storage class for requests tracking.
     """
 
-    def __init__(self, speedometer: Speedometer):
+    def __init__(self, speedometer: Speedometer, requests_to_do: Queue = None):
         self.speedometer = speedometer
 
-        self.requests_to_do = Queue()
+        self.requests_to_do = Queue() if requests_to_do is None else requests_to_do
         self.requests_done = Queue()
         self.requests_done_data = Queue()
         self.num_requests_to_do = 0
         self.num_containers_done = 0
         self.num_requests_done = 0
+        self.all_done = Condition()
+
+    def count_request_to_do(self):
+        with self.all_done:
+            self.num_requests_to_do += 1
 
-    def add_request_to_do(self, req: 'Request', *_, **__):
-        self.requests_to_do.put({'request': req, 'speedometer': self.speedometer})
-        self.num_requests_to_do += 1
+    def put_request_to_do(self, req: 'Request'):
+        # child or retried request fills existing container, so it is not counted in num_requests_to_do
+        self.requests_to_do.put(req)
 
-    def add_request_done_data(self, container: 'RequestData'):
-        self.requests_done_data.put(container)
-        self.num_containers_done += 1
+    def add_request_done_data(self, container: 'RequestData', done_queue: Queue = None):
+        with self.all_done:
+            (self.requests_done_data if done_queue is None else done_queue).put(container)
+            self.num_containers_done += 1
+            self.all_done.notify_all()
 
 
 class RequestsHandler:
-    def __init__(self, speedometer: 'Speedometer' = None, max_memory=100):
+    """
+    Args:
+        speedometer (Speedometer): rate limiter shared by drivers.
+        max_memory (int): num of simultaneous requests to store in memory.
+        post_processor (ProcessPoolStage): stage to run parsers postprocess in, inline in workers if None.
+        retry_policy (RetryPolicy): default policy for requests and parsers without own one.
+        circuit_breaker (CircuitBreaker): pauses speedometer on consecutive failures.
+        cache (ResponseCache): cache of raw data, hits skip drivers and speedometer.
+        metrics (Metrics): registry to collect core metrics in, not collected if None.
+        requests_queue (Queue): queue of requests to do, FIFO if None. FairQueue serves them by
+            priority, deadline and tenants share.
+        coalesce (bool): request identical to pending or in flight one is not sent, but completed
+            with all parts of its container, children included, once it is completed. Requests are identical
+            by cache key, data is shared, not copied. Child requests are not coalesced.
+        request_timeout (float): seconds single attempt may take, failed with TimeoutError and retried
+            by policy after it. Request.timeout overrides it. Late result is kept if it comes first.
+        hedge_quantile (float): request running longer than this quantile of recent latencies is sent
+            once more if speedometer has spare budget, the first result is kept. Not hedged if None.
+    """
+
+    def __init__(self, speedometer: 'Speedometer' = None, max_memory=100,
+                 post_processor: 'ProcessPoolStage' = None, retry_policy: 'RetryPolicy' = None,
+                 circuit_breaker: 'CircuitBreaker' = None, cache: 'ResponseCache' = None,
+                 metrics: 'Metrics' = None, requests_queue: Queue = None, coalesce: bool = False,
+                 request_timeout: float = None, hedge_quantile: float = None):
         speedometer = speedometer or Speedometer()
-        self._inner_q = _InnerQ(speedometer)
+        self._inner_q = _InnerQ(speedometer, requests_queue)
+        self._post_processor = post_processor
+        self._retry_policy = retry_policy
+        self._circuit_breaker = circuit_breaker
+        self._cache = cache
+        self._scheduler = Scheduler()
+        self._max_memory = max_memory
         self._available_request_ids = Queue(maxsize=max_memory)
         for i in range(max_memory):
             self._available_request_ids.put(i)
         self._request_id_container_mapper = dict()
         self._request_id_request_mapper = dict()
+        self._request_id_done_queue_mapper = dict()  # containers of streams go to own queues
+        self._containers_lock = Lock()
+        self._coalesce = coalesce
+        self._in_flight = dict()  # request key -> requests waiting for the first one
+        self._in_flight_keys = dict()  # id of request sent -> its key
+        self._in_flight_lock = Lock()
+        self._request_timeout = request_timeout
+        self._hedge_quantile = hedge_quantile
+        self._hedge_after = None  # seconds, updated from latencies
+        self._latencies = collections.deque(maxlen=1024)
+        self._hedged = set()  # ids of requests hedged already
+        self._resolve_lock = Lock()
+        # Request -> Speedometer it would be executed under, set by drivers with own limiters, e.g. ShardedDriver
+        self.limiter_of = None
+
+        self.metrics = metrics or NullMetrics()
+        self.metrics.gauge_fn('multiparser_requests_to_do', self.requests_to_do.qsize)
+        self.metrics.gauge_fn('multiparser_requests_done', self.requests_done.qsize)
+        self.metrics.gauge_fn('multiparser_containers_used',
+                              lambda: self._max_memory - self._available_request_ids.qsize())
+        self.metrics.set('multiparser_containers_max', max_memory)
 
         self._done = False
 
         self._thread_worker = None
 
-    def add_request(self, req: 'Request'):
-        if not self._available_request_ids.empty():
-            req_id = self._available_request_ids.get()
-            req.container_idx = req_id
-            self._request_id_request_mapper[req_id] = req
-            self._inner_q.add_request_to_do(req)
-        else:
+    def add_request(self, req: 'Request', block: bool = False, timeout: float = None, done_queue: Queue = None):
+        """
+        Args:
+            req (Request): request to execute.
+            block (bool): wait for free container instead of raising MaxMemoryLimit.
+            timeout (float): max seconds to wait if block.
+            done_queue (Queue): queue to put completed container to, requests_done_data if None.
+                Callers sharing handler get only own containers from own queues.
+        """
+        try:
+            req_id = self._available_request_ids.get(block=block, timeout=timeout)
+        except Empty:
             raise MaxMemoryLimit('max amount of requests parsing already')
+        req.container_idx = req_id
+        self._request_id_request_mapper[req_id] = req
+        self._request_id_container_mapper[req_id] = RequestData(req)
+        if done_queue is not None:
+            self._request_id_done_queue_mapper[req_id] = done_queue
+        self._inner_q.count_request_to_do()
+        self._schedule(req, coalesce=self._coalesce)
+
+    def _schedule(self, req: 'Request', coalesce: bool = False):
+        if self._cache is not None:
+            hit, data = self._cache.get(req)
+            if hit:
+                self.metrics.inc('multiparser_cache_hits_total')
+                req.resolved = True
+                self._put_data(req, data)
+                return
+            self.metrics.inc('multiparser_cache_misses_total')
+        if coalesce and self._attach(req):
+            return
+        self._inner_q.put_request_to_do(req)
+
+    def _attach(self, req: 'Request') -> bool:
+        """
+        Returns:
+            bool: True if identical request is in flight already and req waits for its result.
+        """
+        key = request_key(req)
+        with self._in_flight_lock:
+            followers = self._in_flight.get(key)
+            if followers is None:
+                self._in_flight[key] = list()
+                self._in_flight_keys[id(req)] = key
+                return False
+            followers.append(req)
+        self.metrics.inc('multiparser_coalesced_total')
+        return True
+
+    def _detach(self, req: 'Request') -> list:
+        with self._in_flight_lock:
+            key = self._in_flight_keys.pop(id(req), None)
+            return list() if key is None else self._in_flight.pop(key)
+
+    def add_child_request(self, parent: 'Request', child: 'Request', attempt: int = None) -> bool:
+        """
+        Add request to fill the same container as parent, e.g. next page found while parsing.
+        Container is completed once parent and all children are done.
+
+        Args:
+            parent (Request): request being parsed.
+            child (Request): request to add.
+            attempt (int): parent's attempt child was found in, child of retried attempt is dropped.
+
+        Returns:
+            bool: False if child is dropped: parent is resolved already or retried since attempt.
+        """
+        if parent.resolved or (attempt is not None and attempt != parent.attempt):
+            self.metrics.inc('multiparser_discarded_children_total')
+            return False
+        return self._add_child(parent, child)
+
+    def _add_child(self, parent: 'Request', child: 'Request') -> bool:
+        # unresolved parent's part is not done, so its container is not completed and freed yet
+        with self._containers_lock:
+            container = self._request_id_container_mapper[parent.container_idx]
+            child.container_idx = parent.container_idx
+            child.current_part = container.total_parts
+            container.total_parts += 1
+        self._schedule(child)
+        return True
+
+    def submit(self, requests: Iterable['Request'], window: int = None) -> RequestStream:
+        """
+        Lazily add requests from iterable, blocking while in flight window is full.
+
+        Args:
+            requests (Iterable): requests to execute, may be generator.
+            window (int): max requests in flight, max_memory by default.
+
+        Returns:
+            RequestStream: stream to iterate completed RequestData from.
+        """
+        return RequestStream(self, requests, window or self._max_memory)
 
     def free_request_id(self, req_id: int):
         self._request_id_container_mapper.pop(req_id, None)
@@ -95,34 +246,221 @@ class RequestsHandler:
     def num_requests_undone(self) -> int:
         return self.num_requests_to_do - self.num_containers_done
 
-    def gather_results(self):
-        while not self._done:
-            q = self.requests_done
-            while not q.empty():
-                request_data = q.get()
-                request_done = request_data['request']
+    def wait_done(self, timeout: float = None) -> bool:
+        """
+        Block till all added requests are gathered into containers.
+
+        Args:
+            timeout (float): max seconds to wait.
+
+        Returns:
+            bool: False if timeout expired.
+        """
+        with self._inner_q.all_done:
+            return self._inner_q.all_done.wait_for(lambda: self.num_requests_undone <= 0, timeout)
 
-                request = self._request_id_request_mapper[request_done.container_idx]
-                container = self._request_id_container_mapper.get(request.container_idx, RequestData())
+    def track(self, req: 'Request', watchdog: bool = True) -> tuple:
+        """
+        Arm timeout and hedge timers of request execution, called by driver right before request is sent.
 
-                # in case user changed parent idx while parsing:
-                request_data['request'] = request
+        Args:
+            req (Request): request to be sent.
+            watchdog (bool): arm timeout timer, False if driver cancels request on timeout itself.
 
-                container.add_data(request_data)
-                self._inner_q.num_requests_done += 1
-                if container.is_completed():
-                    self._inner_q.add_request_done_data(container)
-                    self.free_request_id(request.container_idx)
+        Returns:
+            tuple: tracking to pass to untrack.
+        """
+        entries = list()
+        timeout = self.timeout_of(req)
+        if watchdog and timeout:
+            entries.append(self._scheduler.call_later(timeout, partial(self._on_timeout, req, req.attempt, timeout)))
+        if self._hedge_after is not None and id(req) not in self._hedged:
+            entries.append(self._scheduler.call_later(self._hedge_after, partial(self._on_hedge, req, req.attempt)))
+        return req.attempt, time.perf_counter(), entries
 
-            time.sleep(0.5)
+    def untrack(self, req: 'Request', tracking: tuple) -> bool:
+        """
+        Disarm timers of request execution, called by driver once request is answered or failed.
+
+        Returns:
+            bool: False if execution is stale: request is resolved or timed out and retried meanwhile.
+        """
+        attempt, sent, entries = tracking
+        for entry in entries:
+            self._scheduler.cancel(entry)
+        if self._hedge_quantile is not None:
+            self._latencies.append(time.perf_counter() - sent)
+            if len(self._latencies) >= 32 and len(self._latencies) % 32 == 0:
+                latencies = sorted(self._latencies)
+                self._hedge_after = latencies[int(self._hedge_quantile * (len(latencies) - 1))]
+        return not req.resolved and req.attempt == attempt
+
+    def timeout_of(self, req: 'Request') -> 'float | None':
+        return req.timeout or self._request_timeout
+
+    def _on_timeout(self, req: 'Request', attempt: int, timeout: float):
+        if req.resolved or req.attempt != attempt:
+            return
+        self.metrics.inc('multiparser_timeouts_total')
+        error = TimeoutError(f'{req} took more than {timeout}s')
+        if not self.retry(req, error):
+            print(f'RequestsHandler caught {error}')
+            self.put_result(req, None, error)
+
+    def _on_hedge(self, req: 'Request', attempt: int):
+        if req.resolved or req.attempt != attempt or id(req) in self._hedged:
+            return
+        # hedge only with spare budget, so hedges do not delay other requests
+        speedometer = self.speedometer if self.limiter_of is None else self.limiter_of(req)
+        if speedometer.delay(req.weight) > 0:
+            return
+        self._hedged.add(id(req))
+        self.metrics.inc('multiparser_hedges_total')
+        self._inner_q.put_request_to_do(req)
+
+    def _resolve(self, req: 'Request') -> bool:
+        """
+        Returns:
+            bool: True if it is the first result of request, the others are discarded.
+        """
+        with self._resolve_lock:
+            if req.resolved:
+                return False
+            req.resolved = True
+        self._hedged.discard(id(req))
+        return True
+
+    def retry(self, req: 'Request', error: Exception, retry_after: float = None,
+              speedometer: Speedometer = None) -> bool:
+        """
+        Schedule failed request to be executed again, worker is not blocked while waiting.
+
+        Args:
+            req (Request): failed request.
+            error (Exception): caught exception.
+            retry_after (float): seconds server asked to wait, all workers are paused for it.
+            speedometer (Speedometer): limiter of driver request failed on, handler's one if None.
+
+        Returns:
+            bool: False if request should not be retried.
+        """
+        self.metrics.inc('multiparser_errors_total', labels={'error': type(error).__name__})
+        speedometer = speedometer or self.speedometer
+        if retry_after:
+            self.metrics.inc('multiparser_retry_after_total')
+            speedometer.pause(retry_after)
+        if self._circuit_breaker is not None:
+            self._circuit_breaker.record_failure(speedometer)
+
+        policy = req.retry_policy or getattr(req.parser, 'retry_policy', None) or self._retry_policy
+        if policy is None or not policy.should_retry(error, req.attempt):
+            return False
+        delay = policy.delay(req.attempt, retry_after)
+        req.attempt += 1
+        self.metrics.inc('multiparser_retries_total')
+        print(f'RequestsHandler retries {req} in {delay:.2f}s after {error}')
+        self._scheduler.call_later(delay, partial(self._inner_q.put_request_to_do, req))
+        return True
+
+    def put_result(self, req: 'Request', data: Any, error: Exception = None, children: list = ()):
+        """
+        Pass raw data received by driver through postprocess to gathering.
+
+        Args:
+            req (Request): executed request.
+            data (Any): raw data.
+            error (Exception): exception request failed with, if any.
+            children (list): (parent, child) requests found by execution, added if result is kept.
+        """
+        if not self._resolve(req):
+            self.metrics.inc('multiparser_discarded_total')
+            return
+        # children are counted in container before parent's part is done
+        for parent, child in children:
+            self._add_child(parent, child)
+        if error is None and self._circuit_breaker is not None:
+            self._circuit_breaker.record_success()
+        if error is not None:
+            self.metrics.inc('multiparser_failed_total')
+            self.requests_done.put(Result(req, None, error))
+            return
+        if data is not None and self._cache is not None:
+            self._cache.put(req, data)
+        self._put_data(req, data)
+
+    def _put_data(self, req: 'Request', data: Any):
+        error = None
+        if data is not None and self._post_processor is not None:
+            self._post_processor.submit(req, data, partial(self._on_postprocessed, time.perf_counter()))
+            return
+        if data is not None:
+            started = time.perf_counter()
+            try:
+                data = req.postprocess(data)
+            except Exception as e:
+                print(f'RequestsHandler caught {e} on postprocess')
+                data, error = None, e
+            self.metrics.observe('multiparser_postprocess_seconds', time.perf_counter() - started)
+        self.requests_done.put(Result(req, data, error))
+
+    def _on_postprocessed(self, started: float, result: Result):
+        # includes time spent in pool queue
+        self.metrics.observe('multiparser_postprocess_seconds', time.perf_counter() - started)
+        self.requests_done.put(result)
+
+    def handle_result(self, result: Result):
+        request_done = result.request
+        request = self._request_id_request_mapper[request_done.container_idx]
+        container = self._request_id_container_mapper[request.container_idx]
+
+        with self._containers_lock:
+            container.add_data(result)
+            completed = container.is_completed()
+        self._inner_q.num_requests_done += 1
+        if completed:
+            self._complete(request, container)
+            if self._coalesce:
+                # followers get every part, children added while parsing included
+                for follower in self._detach(request):
+                    self._complete_follower(follower, container)
+
+    def _complete(self, request: 'Request', container: RequestData):
+        self.metrics.inc('multiparser_containers_done_total')
+        done_queue = self._request_id_done_queue_mapper.pop(request.container_idx, None)
+        # free id first, so consumer of done data could add new request at once.
+        self.free_request_id(request.container_idx)
+        self._inner_q.add_request_done_data(container, done_queue)
+
+    def _complete_follower(self, follower: 'Request', leader_container: RequestData):
+        container = self._request_id_container_mapper[follower.container_idx]
+        container.total_parts = leader_container.total_parts
+        for part, result in leader_container.data.items():
+            container.add_data(Result(follower, result.data, result.error) if part == 0 else result)
+        self._inner_q.num_requests_done += 1
+        self._complete(follower, container)
+
+    def gather_results(self):
+        q = self.requests_done
+        while True:
+            result = q.get()
+            if result is None:  # stop sentinel
+                break
+            self.handle_result(result)
 
     def start(self):
         self._done = False
+        if self._post_processor is not None:
+            self._post_processor.start()
+        self._scheduler.start()
         self._thread_worker = Thread(target=self.gather_results)
         self._thread_worker.start()
 
     def stop(self):
         self._done = True
+        self._scheduler.stop()
+        if self._post_processor is not None:
+            self._post_processor.stop()
+        self.requests_done.put(None)
 
     def join(self):
         self._thread_worker.join()
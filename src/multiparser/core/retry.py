@@ -0,0 +1,66 @@
+import random
+import threading
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    Args:
+        max_retries (int): max attempts after the first one.
+        backoff (float): delay before first retry in seconds.
+        max_backoff (float): delay limit in seconds.
+        jitter (bool): randomize delay in [0, delay].
+        retry_on (tuple): exception types to retry.
+    """
+
+    def __init__(self, max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 30., jitter: bool = True,
+                 retry_on: tuple = (Exception,)):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        return attempt < self.max_retries and isinstance(error, self.retry_on)
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """
+        Args:
+            attempt (int): num of retries done already.
+            retry_after (float): seconds server asked to wait.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return max(delay, retry_after or 0)
+
+
+class CircuitBreaker:
+    """
+    Pauses speedometer, and so all workers, after several consecutive failures.
+
+    Args:
+        failure_threshold (int): consecutive failures to open circuit.
+        reset_timeout (float): seconds to pause for.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self, speedometer: 'Speedometer'):
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.failure_threshold:
+                return
+            self._failures = 0
+        print(f'CircuitBreaker opened for {self.reset_timeout}s')
+        speedometer.pause(self.reset_timeout)
@@ -0,0 +1,61 @@
+import heapq
+import itertools
+import time
+from threading import Condition, Thread
+
+
+class Scheduler:
+    """
+    Runs callbacks after delay on a single thread, so waiting does not block workers.
+    """
+
+    def __init__(self):
+        self._heap = list()
+        self._counter = itertools.count()
+        self._state = Condition()
+        self._done = False
+        self._working_thread = None
+
+    def call_later(self, delay: float, callback: callable) -> list:
+        """
+        Args:
+            delay (float): seconds to wait.
+            callback (callable): called without arguments.
+
+        Returns:
+            list: entry to pass to cancel.
+        """
+        entry = [time.monotonic() + delay, next(self._counter), callback]
+        with self._state:
+            heapq.heappush(self._heap, entry)
+            self._state.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry: list):
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._state:
+                while not self._done and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._state.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if self._done:
+                    break
+                callback = heapq.heappop(self._heap)[2]
+            if callback is not None:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f'Scheduler caught {e}')
+
+    def start(self):
+        self._done = False
+        self._working_thread = Thread(target=self._run, daemon=True)
+        self._working_thread.start()
+
+    def stop(self):
+        with self._state:
+            self._done = True
+            self._state.notify()
+        self._working_thread.join()
@@ -0,0 +1,168 @@
+import collections
+import time
+from queue import Empty, Queue
+from threading import Thread
+
+from multiparser.core.mthread_driver import MultiThreadDriver
+
+
+class Shard:
+    """
+    Credential or endpoint with own rate limit and workers.
+
+    Args:
+        name (str): name to pin requests with Request.shard.
+        driver_constructor (callable): driver constructor bound to shard client, e.g. partial(BinanceDriver, client).
+        speedometer (Speedometer): limiter of shard key.
+        n_workers (int): N workers to create.
+        multi_driver (callable): MultiThreadDriver or AsyncMultiDriver.
+    """
+
+    def __init__(self, name: str, driver_constructor: callable, speedometer: 'Speedometer', n_workers: int = 1,
+                 multi_driver: callable = MultiThreadDriver):
+        self.name = name
+        self.driver_constructor = driver_constructor
+        self.speedometer = speedometer
+        self.n_workers = n_workers
+        self.multi_driver = multi_driver
+
+        self.requests_to_do = Queue()
+
+    def __repr__(self) -> str:
+        s = f'{self.__class__.__name__}[{self.name}, {self.n_workers} workers]'
+        return s
+
+
+class _ShardHandler:
+    """
+    Handler as seen by shard workers: shard queue and speedometer, the rest is handler's.
+    """
+
+    def __init__(self, handler: 'RequestsHandler', shard: Shard):
+        self._handler = handler
+        self._shard = shard
+
+    @property
+    def requests_to_do(self) -> Queue:
+        return self._shard.requests_to_do
+
+    @property
+    def speedometer(self) -> 'Speedometer':
+        return self._shard.speedometer
+
+    def __getattr__(self, name: str):
+        return getattr(self._handler, name)
+
+
+class ShardedDriver:
+    """
+    Runs workers of several shards on one RequestsHandler.
+    Every request goes to the shard it would wait the least on, or to the one it is pinned to
+    with Request.shard, so throughput approaches sum of shards limits.
+    Requests pinned to shard with full queue wait in its backlog, so they do not hold the others.
+    Request pinned to unknown shard is failed with KeyError.
+    Retried requests are dispatched again, so request limited on one key may go to another.
+
+    Args:
+        request_handler (RequestsHandler): handler to execute requests.
+        shards (list): list of Shard.
+        queue_size (int): max requests dispatched to shard ahead, 2 * n_workers of shard if None.
+    """
+
+    def __init__(self, request_handler: 'RequestsHandler', shards: list, queue_size: int = None):
+        self.request_handler = request_handler
+        self.shards = {shard.name: shard for shard in shards}
+        self._queue_sizes = {shard.name: queue_size or 2 * shard.n_workers for shard in shards}
+        self._backlogs = {shard.name: collections.deque() for shard in shards}  # pinned requests waiting for room
+
+        self._drivers = list()
+        self._done = False
+        self._working_thread = None
+
+    def _has_room(self, shard: Shard) -> bool:
+        return shard.requests_to_do.qsize() < self._queue_sizes[shard.name]
+
+    def route(self, req: 'Request') -> Shard:
+        """
+        Returns:
+            Shard: shard to execute request on.
+        """
+        if req.shard is not None:
+            return self.shards[req.shard]
+        return min(self.shards.values(),
+                   key=lambda shard: (not self._has_room(shard), shard.speedometer.delay(req.weight),
+                                      shard.requests_to_do.qsize()))
+
+    def limiter_of(self, req: 'Request') -> 'Speedometer':
+        """
+        Limiter of shard request would be dispatched to, e.g. for handler to decide on hedging.
+        """
+        if req.shard is not None and req.shard not in self.shards:
+            return self.request_handler.speedometer
+        return self.route(req).speedometer
+
+    def dispatch(self, req: 'Request'):
+        """
+        Put request to shard queue, pinned request to shard backlog if its queue is full.
+        Unpinned request is dispatched only while some shard has room.
+        """
+        if req.shard is not None and req.shard not in self.shards:
+            self.request_handler.put_result(req, None, KeyError(f'unknown shard {req.shard}'))
+            return
+        shard = self.route(req)
+        # single dispatcher puts to shard queues, so room checked is not taken by others
+        if self._has_room(shard) and not self._backlogs[shard.name]:
+            shard.requests_to_do.put(req)
+        else:
+            self._backlogs[shard.name].append(req)
+
+    def _drain_backlogs(self):
+        for name, backlog in self._backlogs.items():
+            shard = self.shards[name]
+            while backlog and self._has_room(shard):
+                shard.requests_to_do.put(backlog.popleft())
+
+    def thread_worker(self):
+        q = self.request_handler.requests_to_do
+        while not self._done:
+            self._drain_backlogs()
+            if not any(self._has_room(shard) for shard in self.shards.values()):
+                time.sleep(0.01)
+                continue
+            try:
+                # backlogs are drained as shard queues get room
+                req = q.get(timeout=0.01 if any(self._backlogs.values()) else None)
+            except Empty:
+                continue
+            if req is None:  # wake up sentinel, put on stop
+                continue
+            try:
+                self.dispatch(req)
+            except Exception as e:
+                print(f'ShardedDriver caught {e} on dispatch of {req}')
+                self.request_handler.put_result(req, None, e)
+
+    def start(self):
+        print(f'ShardedDriver started on {list(self.shards)}')
+        self._done = False
+        self.request_handler.limiter_of = self.limiter_of
+        for shard in self.shards.values():
+            driver = shard.multi_driver(_ShardHandler(self.request_handler, shard), n_workers=shard.n_workers,
+                                        driver_constructor=shard.driver_constructor)
+            driver.start()
+            self._drivers.append(driver)
+        self._working_thread = Thread(target=self.thread_worker)
+        self._working_thread.start()
+
+    def stop(self):
+        print('ShardedDriver stopped')
+        self._done = True
+        self.request_handler.requests_to_do.put(None)
+        self._working_thread.join()
+        for driver in self._drivers:
+            driver.stop()
+        self._drivers = list()
+        self.request_handler.limiter_of = None
+
+    def join(self):
+        self._working_thread.join()
@@ -0,0 +1,59 @@
+import contextlib
+import fcntl
+import mmap
+import os
+import struct
+import time
+
+from multiparser.core.speedometer import TokenBucketSpeedometer
+
+_STATE = struct.Struct('dd')  # theoretical arrival time, paused until
+
+
+class SharedTokenBucketSpeedometer(TokenBucketSpeedometer):
+    """
+    Token bucket shared by all processes opening the same file, e.g. several parsers behind one IP.
+    State is two doubles in memory mapped file, reservation is done under threads lock and
+    file lock, so it costs a pair of flock calls and no IPC round trip.
+    Every process should be created with the same max_speed and burst. POSIX only.
+
+    path (str): state file path, created if missing.
+    max_speed (float): Max speed in req/sec shared by all processes.
+    burst (int): bucket capacity.
+    """
+
+    # wall clock, as monotonic one is not comparable between processes everywhere
+    _clock = staticmethod(time.time)
+
+    def __init__(self, path: str, max_speed: float = float('inf'), burst: int = 1):
+        super().__init__(max_speed, burst)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < _STATE.size:
+                os.ftruncate(self._fd, _STATE.size)  # zero filled: bucket full, no pause
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._mmap = mmap.mmap(self._fd, _STATE.size)
+
+    @contextlib.contextmanager
+    def _state(self):
+        with self._inner_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._next_time, self._paused_until = _STATE.unpack_from(self._mmap)
+                yield
+                _STATE.pack_into(self._mmap, 0, self._next_time, self._paused_until)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._mmap.close()
+        os.close(self._fd)
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_speed': self.max_speed, 'burst': self.burst}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
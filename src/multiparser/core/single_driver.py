@@ -2,6 +2,7 @@ from threading import Thread
 from queue import Queue
 import queue
 import threading
+import time
 
 
 class SingleDriverBase:
@@ -20,43 +21,160 @@ class SingleDriverBase:
         self._lock = lock
 
         self._working_thread = None
+        self._labels = {'worker': worker_num}
+        self._children = None  # children found by request being executed, added once its result is kept
+        self._executing = None  # (request, attempt) being executed
+
+        # totals read by autoscaling
+        self.num_done = 0
+        self.wait_time = 0.
+        self.busy_time = 0.
 
         self._done = False
 
+    @property
+    def is_abandoned(self) -> bool:
+        """
+        True if request being executed is answered or retried already, e.g. timed out, so worker is not waited for.
+        Thread is not interrupted, call returns once client gives up.
+        """
+        executing = self._executing
+        return executing is not None and (executing[0].resolved or executing[0].attempt != executing[1])
+
     @property
     def requests_done(self) -> Queue:
         return self._requests_handler.requests_done
 
+    @property
+    def metrics(self) -> 'Metrics':
+        return self._requests_handler.metrics
+
+    @property
+    def speedometer(self) -> 'Speedometer':
+        return self._requests_handler.speedometer
+
+    def report_limits(self, used: dict = None, retry_after: float = None):
+        """
+        Pass server reported limits usage to speedometer.
+
+        Args:
+            used (dict): (kind, interval seconds) -> budget used reported by server.
+            retry_after (float): seconds server asked to wait.
+        """
+        self.speedometer.feedback(used=used, retry_after=retry_after)
+
+    def add_child_request(self, parent: 'Request', child: 'Request'):
+        """
+        Schedule request to fill parent's container, e.g. next page found while parsing.
+        Children found while executing request are added only if its result is kept, so failed, retried,
+        timed out or hedged executions do not add them twice.
+        """
+        if self._children is None:
+            self._requests_handler.add_child_request(parent, child, parent.attempt)
+        else:
+            self._children.append((parent, child))
+
+    def retry_after(self, error: Exception) -> 'float | None':
+        """
+        Seconds server asked to wait before next request, taken from error.
+        """
+        return getattr(error, 'retry_after', None)
+
+    def handle_error(self, req: 'Request', error: Exception) -> bool:
+        """
+        Returns:
+            bool: True if request is scheduled for retry.
+        """
+        if self._requests_handler.retry(req, error, self.retry_after(error), self.speedometer):
+            return True
+        print(f'{self.__class__.__name__}[{self._worker_num}] caught {error}')
+        return False
+
+    def _count(self, started: float, sent: float):
+        latency = time.perf_counter() - sent
+        self.metrics.observe('multiparser_request_seconds', latency, self._labels)
+        self.num_done += 1
+        self.wait_time += sent - started
+        self.busy_time += latency
+
+    def setup(self):
+        """
+        Create per worker resources, e.g. own client session. Called in worker thread before first request.
+        """
+        pass
+
+    def teardown(self):
+        """
+        Release resources created in setup. Called in worker thread once it is stopped.
+        """
+        pass
+
     def thread_worker(self):
+        self.setup()
+        try:
+            self._work()
+        finally:
+            self.teardown()
+
+    def _work(self):
         while not self._done:
             try:
-                req_data = self._requests_handler.requests_to_do.get(timeout=1)
-                req = req_data['request']
-                speedometer = req_data['speedometer']
+                req = self._requests_handler.requests_to_do.get(timeout=1)
+                if req is None or req.resolved:  # wake up sentinel, or hedge of request answered already
+                    continue
 
-                speedometer.wait_required_time(self._lock)
+                started = time.perf_counter()
+                self.speedometer.wait_required_time(self._lock, req.weight)
+                sent = time.perf_counter()
+                self.metrics.observe('multiparser_limiter_wait_seconds', sent - started)
 
+                tracking = self._requests_handler.track(req)
+                self._children = list()
+                self._executing = (req, req.attempt)
                 try:
                     parsed_data = req(self)
                 except Exception as e:
-                    print(f'SingleDriverBase[{self._worker_num}] caught {e}')
-                    parsed_data = None
+                    self._executing = self._children = None
+                    self._count(started, sent)
+                    # stale execution failure is dropped, request is handled on timeout already
+                    if self._requests_handler.untrack(req, tracking) and not self.handle_error(req, e):
+                        self._requests_handler.put_result(req, None, e)
+                    continue
 
-                result = {'request': req, 'data': parsed_data}
-
-                self.requests_done.put(result)
+                children, self._children, self._executing = self._children, None, None
+                self._count(started, sent)
+                self._requests_handler.untrack(req, tracking)
+                self._requests_handler.put_result(req, parsed_data, children=children)
             except queue.Empty:
                 pass
 
     def start(self):
         print(f'SingleDriverBase[{self._worker_num}] started')
-        self._working_thread = Thread(target=self.thread_worker)
+        # daemon, so worker stuck in call nobody waits for does not keep process alive
+        self._working_thread = Thread(target=self.thread_worker, daemon=True)
         self._working_thread.start()
 
-    def stop(self):
+    def signal_stop(self, wake: bool = True):
+        """
+        Ask worker to stop without waiting for it.
+
+        Args:
+            wake (bool): put wake up sentinel. Any worker may take it, so stopping several workers
+                should mark all of them first and put sentinels after.
+        """
         print(f'SingleDriverBase[{self._worker_num}] stopped')
         self._done = True
+        if wake:
+            self._requests_handler.requests_to_do.put(None)
+
+    def stop(self):
+        self.signal_stop()
         self.join()
 
-    def join(self):
-        self._working_thread.join()
+    def join(self, timeout: float = None) -> bool:
+        """
+        Returns:
+            bool: True if worker is stopped.
+        """
+        self._working_thread.join(timeout)
+        return not self._working_thread.is_alive()
@@ -1,26 +1,226 @@
+import threading
 import time
 
 
+def cost_of(cost: 'int | dict', kind: str = 'weight') -> int:
+    """
+    Amount of budget of given kind consumed by request.
+
+    Args:
+        cost (int | dict): request weight or mapping kind -> amount.
+        kind (str): one of 'weight', 'raw', 'orders'.
+    """
+    if isinstance(cost, dict):
+        return cost.get(kind, 1 if kind == 'raw' else 0)
+    return {'weight': cost, 'raw': 1}.get(kind, 0)
+
+
 class Speedometer:
     """
     CLass to dynamically adjust request rates.
     Adjusts wait time to mean_speed < max_speed.
 
+    Slot is reserved under inner lock in O(1), sleeping is done outside any lock,
+    so waiting threads do not queue behind a single sleeper.
+
     max_speed (float): Max speed in req/sec
-    window (int): calculate mean value.
     """
 
+    _clock = staticmethod(time.monotonic)
+
     def __init__(self, max_speed: float = float('inf')):
         self.max_speed = max_speed
         self.frequency = 1 / max_speed
 
-        self._last_time_activated = 0
+        self._next_time = 0.
+        self._paused_until = 0.
+        self._inner_lock = threading.Lock()
+
+    def _state(self) -> 'Lock':
+        # guards _next_time and _paused_until, shared speedometers load and store them around
+        return self._inner_lock
+
+    def _reserve(self, now: float, cost: 'int | dict') -> float:
+        start = max(self._next_time, now)
+        self._next_time = start + self.frequency * cost_of(cost)
+        return start - now
+
+    def _delay(self, now: float, cost: 'int | dict') -> float:
+        return max(self._next_time, now) - now
+
+    def delay(self, cost: 'int | dict' = 1) -> float:
+        """
+        Seconds request would wait if reserved now, nothing is reserved.
+
+        Args:
+            cost (int | dict): request weight.
+        """
+        with self._state():
+            now = self._clock()
+            resume = max(now, self._paused_until)
+            return resume - now + self._delay(resume, cost)
+
+    def reserve(self, cost: 'int | dict' = 1) -> float:
+        """
+        Reserve slot for request.
+
+        Args:
+            cost (int | dict): request weight.
+
+        Returns:
+            float: seconds to wait before request could be made.
+        """
+        with self._state():
+            now = self._clock()
+            resume = max(now, self._paused_until)
+            return resume - now + self._reserve(resume, cost)
+
+    def wait_required_time(self, lock: 'Lock' = None, cost: 'int | dict' = 1):
+        """
+        Reserve slot and sleep till it is available.
+
+        Args:
+            lock (Lock): kept for backward compatibility, reservation is guarded by inner lock.
+            cost (int | dict): request weight.
+        """
+        delay = self.reserve(cost)
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """
+        Forbid any requests for given amount of seconds.
+        """
+        with self._state():
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def feedback(self, used: dict = None, retry_after: float = None):
+        """
+        Adjust budget from server answer.
+
+        Args:
+            used (dict): (kind, interval seconds) -> budget used reported by server.
+            retry_after (float): seconds server asked to wait.
+        """
+        if retry_after:
+            self.pause(retry_after)
+
+
+class TokenBucketSpeedometer(Speedometer):
+    """
+    Token bucket speedometer with burst allowance.
+    Bucket of `burst` tokens is refilled with max_speed tokens/sec,
+    requests may go without waiting while bucket is not empty.
+
+    Implemented as GCRA: only theoretical arrival time is stored, so reservation is O(1).
+
+    max_speed (float): Max speed in req/sec
+    burst (int): bucket capacity.
+    """
+
+    def __init__(self, max_speed: float = float('inf'), burst: int = 1):
+        super().__init__(max_speed)
+        self.burst = burst
+        self._tolerance = self.frequency * (burst - 1)
+
+    def _reserve(self, now: float, cost: 'int | dict') -> float:
+        tat = max(self._next_time, now)
+        delay = max(0., tat - self._tolerance - now)
+        self._next_time = tat + self.frequency * cost_of(cost)
+        return delay
+
+    def _delay(self, now: float, cost: 'int | dict') -> float:
+        return max(0., max(self._next_time, now) - self._tolerance - now)
+
+
+class RateWindow:
+    """
+    Fixed window limit, windows are aligned to epoch like exchange ones.
+
+    limit (int): budget per window.
+    interval (float): window length in seconds.
+    kind (str): budget kind, 'weight', 'raw' or 'orders'.
+    """
+
+    def __init__(self, limit: int, interval: float, kind: str = 'weight'):
+        self.limit = limit
+        self.interval = interval
+        self.kind = kind
+
+        self.start = 0.  # start of latest window with reservations, may be in future.
+        self.used = 0
+
+    def earliest(self, t: float, amount: int) -> float:
+        start = max(self.start, t - t % self.interval)
+        if start == self.start and self.used + amount > self.limit:
+            start += self.interval
+        return max(t, start)
+
+    def commit(self, t: float, amount: int):
+        start = t - t % self.interval
+        if start > self.start:
+            self.start = start
+            self.used = 0
+        self.used += amount
+
+    def sync(self, now: float, used: int):
+        start = now - now % self.interval
+        if start > self.start:
+            self.start = start
+            self.used = used
+        elif start == self.start:
+            self.used = max(self.used, used)
+
+    def __repr__(self) -> str:
+        s = f'{self.__class__.__name__}[{self.kind}: {self.used}/{self.limit} per {self.interval}s]'
+        return s
+
+
+class MultiWindowSpeedometer(Speedometer):
+    """
+    Speedometer enforcing several weighted windows together,
+    e.g. request weight per minute and raw requests per 5 minutes.
+    Window usage is synced from server reported usage via feedback.
+
+    windows (list): list of RateWindow.
+    """
+
+    def __init__(self, windows: list):
+        super().__init__()
+        self.windows = windows
+
+    def _earliest(self, now: float, amounts: list) -> float:
+        # fixed point: the earliest time every window has budget at
+        t = prev = max(now, now - self._clock() + self._paused_until)
+        while True:
+            for window, amount in zip(self.windows, amounts):
+                if amount:
+                    t = window.earliest(t, amount)
+            if t == prev:
+                return t
+            prev = t
+
+    def delay(self, cost: 'int | dict' = 1) -> float:
+        amounts = [cost_of(cost, window.kind) for window in self.windows]
+        with self._inner_lock:
+            now = time.time()
+            return self._earliest(now, amounts) - now
+
+    def reserve(self, cost: 'int | dict' = 1) -> float:
+        amounts = [cost_of(cost, window.kind) for window in self.windows]
+        with self._inner_lock:
+            now = time.time()
+            t = self._earliest(now, amounts)
+            for window, amount in zip(self.windows, amounts):
+                if amount:
+                    window.commit(t, amount)
+            return t - now
 
-    def wait_required_time(self, lock: 'Lock'):
-        with lock:
-            delta = time.time() - self._last_time_activated
-            if delta > self.frequency:
-                pass
-            else:
-                time.sleep(self.frequency - delta)
-            self._last_time_activated = time.time()
+    def feedback(self, used: dict = None, retry_after: float = None):
+        super().feedback(retry_after=retry_after)
+        if used:
+            with self._inner_lock:
+                now = time.time()
+                for window in self.windows:
+                    if (window.kind, window.interval) in used:
+                        window.sync(now, used[(window.kind, window.interval)])
@@ -0,0 +1,102 @@
+from queue import Queue
+from threading import Condition, Semaphore, Thread
+from typing import Iterable, Iterator
+
+from multiparser.core.request import RequestData
+
+
+class RequestStream:
+    """
+    Lazily feeds requests into handler and yields completed containers.
+    Feeding blocks while `window` requests are submitted but not yielded yet,
+    so memory is bounded for any amount of requests.
+    Containers of stream are put to its own queue, so streams and direct add_request callers
+    may share one handler.
+
+    Args:
+        requests_handler (RequestsHandler): handler to execute requests.
+        requests (Iterable): requests to submit, may be generator.
+        window (int): max requests in flight.
+    """
+
+    def __init__(self, requests_handler: 'RequestsHandler', requests: Iterable['Request'], window: int):
+        self._requests_handler = requests_handler
+        self._requests = requests
+        self._slots = Semaphore(window)
+        self._state = Condition()
+        self._done = Queue()
+        self._order = dict()  # id(request) -> submission idx
+        self._num_submitted = 0
+        self._exhausted = False
+        self._closed = False
+        self._error = None
+
+        self._feeder = Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    @property
+    def num_submitted(self) -> int:
+        return self._num_submitted
+
+    def _feed(self):
+        try:
+            for idx, req in enumerate(self._requests):
+                self._slots.acquire()
+                if self._closed:
+                    break
+                self._order[id(req)] = idx
+                self._requests_handler.add_request(req, block=True, done_queue=self._done)
+                with self._state:
+                    self._num_submitted += 1
+        except Exception as e:
+            self._error = e
+        with self._state:
+            self._exhausted = True
+        # wake up results consumer in case nothing is in flight
+        self._done.put(None)
+
+    def close(self):
+        """
+        Stop feeding requests, e.g. once consumer stops iterating results early.
+        Requests in flight are completed, their containers are dropped with stream.
+        """
+        self._closed = True
+        self._slots.release()  # wake up feeder waiting for a slot
+
+    def results(self, ordered: bool = False) -> Iterator[RequestData]:
+        """
+        Yield completed containers. Stream is closed once generator is closed or collected.
+
+        Args:
+            ordered (bool): yield in submission order instead of completion order.
+        """
+        num_yielded = 0
+        next_idx = 0
+        pending = dict()
+        try:
+            while True:
+                with self._state:
+                    if self._exhausted and num_yielded == self._num_submitted:
+                        break
+                container = self._done.get()
+                if container is None:  # feeder exhausted sentinel
+                    continue
+                idx = self._order.pop(id(container.request))
+                if not ordered:
+                    num_yielded += 1
+                    self._slots.release()
+                    yield container
+                    continue
+                pending[idx] = container
+                while next_idx in pending:
+                    num_yielded += 1
+                    self._slots.release()
+                    yield pending.pop(next_idx)
+                    next_idx += 1
+        finally:
+            self.close()
+        if self._error is not None:
+            raise self._error
+
+    def __iter__(self) -> Iterator[RequestData]:
+        return self.results()
@@ -1,7 +1,182 @@
+import re
+from functools import partial
+
+from multiparser.core.async_driver import AsyncSingleDriverBase
 from multiparser.core.single_driver import SingleDriverBase
+from multiparser.core.speedometer import MultiWindowSpeedometer, RateWindow
+
+_USAGE_HEADER = re.compile(r'x-mbx-(used-weight|order-count)-(\d+)([smhd])', re.IGNORECASE)
+_USAGE_KINDS = {'used-weight': 'weight', 'order-count': 'orders'}
+_LIMIT_KINDS = {'REQUEST_WEIGHT': 'weight', 'ORDERS': 'orders', 'RAW_REQUESTS': 'raw'}
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'SECOND': 1, 'MINUTE': 60, 'HOUR': 3600, 'DAY': 86400}
+
+# https://developers.binance.com/docs/binance-spot-api-docs/rest-api/limits
+SPOT_RATE_LIMITS = [
+    {'rateLimitType': 'REQUEST_WEIGHT', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': 6000},
+    {'rateLimitType': 'ORDERS', 'interval': 'SECOND', 'intervalNum': 10, 'limit': 100},
+    {'rateLimitType': 'RAW_REQUESTS', 'interval': 'MINUTE', 'intervalNum': 5, 'limit': 61000},
+]
+
+
+def speedometer_from_rate_limits(rate_limits: list = None, margin: float = 1.) -> MultiWindowSpeedometer:
+    """
+    Build speedometer from exchangeInfo 'rateLimits' section.
+
+    Args:
+        rate_limits (list): exchangeInfo()['rateLimits'], spot defaults if None.
+        margin (float): share of every limit to use.
+    """
+    windows = list()
+    for rate_limit in rate_limits or SPOT_RATE_LIMITS:
+        windows.append(RateWindow(
+            limit=int(rate_limit['limit'] * margin),
+            interval=rate_limit['intervalNum'] * _UNITS[rate_limit['interval']],
+            kind=_LIMIT_KINDS[rate_limit['rateLimitType']]
+        ))
+    return MultiWindowSpeedometer(windows)
+
+
+def parse_limit_usage(headers: dict) -> dict:
+    """
+    Args:
+        headers (dict): response headers or connector 'limit_usage'.
+
+    Returns:
+        dict: (kind, interval seconds) -> used budget.
+    """
+    used = dict()
+    for key, value in headers.items():
+        match = _USAGE_HEADER.fullmatch(key)
+        if match:
+            kind, num, unit = match.groups()
+            used[(_USAGE_KINDS[kind.lower()], int(num) * _UNITS[unit.lower()])] = int(value)
+    return used
+
+
+def mount_pool(session: 'requests.Session', pool_size: int):
+    """
+    Keep up to pool_size connections alive in session, requests keeps 10 by default
+    and reconnects with new TLS handshake above it.
+    """
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+
+class _BinanceLimits:
+    """
+    Reports limits usage of connector responses and errors to speedometer, shared by sync and async drivers.
+    """
+
+    def retry_after(self, error: Exception) -> 'float | None':
+        headers = getattr(error, 'header', None) or dict()
+        retry_after = headers.get('Retry-After') or headers.get('retry-after')
+        if retry_after is None and getattr(error, 'status_code', None) in (418, 429):
+            retry_after = 60
+        return None if retry_after is None else float(retry_after)
+
+    def _report_error(self, error: Exception):
+        headers = getattr(error, 'header', None) or dict()
+        self.report_limits(used=parse_limit_usage(headers), retry_after=self.retry_after(error))
+
+    def _report_response(self, response):
+        """
+        Returns:
+            response data without limits usage.
+        """
+        if isinstance(response, dict) and 'limit_usage' in response:
+            self.report_limits(used=parse_limit_usage(response['limit_usage']))
+            response = response['data']
+        return response
 
 
-class BinanceDriver(SingleDriverBase):
+class BinanceDriver(_BinanceLimits, SingleDriverBase):
+    """
+    Args:
+        client (Spot): connector client shared by all workers, see pooled for client per worker.
+
+    Keyword Args:
+        client_factory (callable): creates own client of worker in setup.
+        pool_size (int): keep-alive connections of own client session.
+        timeout (float): socket timeout passed to client_factory, so call stuck past handler timeout returns.
+    """
+
+    def __init__(self, client: 'Client', *args, client_factory: callable = None, pool_size: int = None,
+                 timeout: float = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = client
+        self.client_factory = client_factory
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+    @classmethod
+    def pooled(cls, client_factory: callable, pool_size: int = 1, timeout: float = None) -> callable:
+        """
+        Driver constructor creating client with own keep-alive session for every worker,
+        so workers do not contend for connections of one shared pool.
+
+        Args:
+            client_factory (callable): e.g. partial(Spot, api_key, api_secret, show_limit_usage=True).
+            pool_size (int): keep-alive connections of every worker session.
+            timeout (float): socket timeout, passed to client_factory as timeout kwarg if set.
+        """
+        return partial(cls, None, client_factory=client_factory, pool_size=pool_size, timeout=timeout)
+
+    def setup(self):
+        if self.client_factory is None:
+            return
+        self.client = self.client_factory() if self.timeout is None else self.client_factory(timeout=self.timeout)
+        session = getattr(self.client, 'session', None)
+        if session is not None and self.pool_size:
+            mount_pool(session, self.pool_size)
+
+    def teardown(self):
+        if self.client_factory is None:
+            return
+        session = getattr(self.client, 'session', None)
+        if session is not None:
+            session.close()
+
+    def request(self, method: str, *args, **kwargs):
+        """
+        Call client method and report limits usage to speedometer.
+        Limits usage is available if client is created with show_limit_usage=True.
+
+        Args:
+            method (str): client method name, e.g. 'klines'.
+        """
+        try:
+            response = getattr(self.client, method)(*args, **kwargs)
+        except Exception as e:
+            self._report_error(e)
+            raise
+        return self._report_response(response)
+
+
+class AsyncBinanceDriver(_BinanceLimits, AsyncSingleDriverBase):
+    """
+    Driver for AsyncMultiDriver, client methods are coroutines answering like connector client does.
+
+    Args:
+        client: async client shared by all workers of event loop.
+    """
+
     def __init__(self, client: 'Client', *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.client = client
+
+    async def request(self, method: str, *args, **kwargs):
+        """
+        Await client method and report limits usage to speedometer.
+
+        Args:
+            method (str): client method name, e.g. 'klines'.
+        """
+        try:
+            response = await getattr(self.client, method)(*args, **kwargs)
+        except Exception as e:
+            self._report_error(e)
+            raise
+        return self._report_response(response)
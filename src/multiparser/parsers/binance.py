@@ -1,33 +1,112 @@
+import time
+
+import numpy as np
 import pandas as pd
-from datetime import datetime, timezone
-import pytz
 
 from multiparser.core.parser import Parser
 from multiparser.core.request import Request
 from multiparser.drivers.binance import BinanceDriver
 
+# longest possible duration of interval, months are taken as 31 days.
+INTERVALS_MS = {'1s': 1000, '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+                '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000,
+                '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000,
+                '1M': 2_678_400_000}
+
 
 class BinanceHistoryGetter(Parser):
     def __init__(self):
         self.df_columns = ['open_time', 'close_time', 'open', 'high', 'low', 'close',
                            'volume', 'quote_asset_volume', 'num_trades', 'taker_buy_base_asset_volume',
                            'taker_buy_quote_asset_volume', 'ignore', 'open_timestamp', 'close_timestamp']
+        self.raw_columns = ['open_timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_timestamp',
+                            'quote_asset_volume', 'num_trades', 'taker_buy_base_asset_volume',
+                            'taker_buy_quote_asset_volume', 'ignore']
+        self.float_columns = ['open', 'high', 'low', 'close', 'volume', 'quote_asset_volume',
+                              'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume']
+
+    def __call__(self, single_driver: BinanceDriver, request: Request, *args, **kwargs) -> list:
+        return single_driver.request('klines', *args, **kwargs)
+
+    def cache_ttl(self, request: Request, symbol: str, interval: str, startTime: int = None, endTime: int = None,
+                  **__) -> 'float | None':
+        # klines are immutable once the last candle in range is closed, the open edge is always refetched.
+        if endTime is not None and endTime + INTERVALS_MS[interval] <= time.time() * 1000:
+            return float('inf')
+        return None
+
+    def postprocess(self, data: list) -> 'pd.DataFrame':
+        if data:
+            # one vectorized conversion per column instead of per row python calls
+            raw = dict(zip(self.raw_columns, zip(*data)))
+            columns = {name: np.array(raw[name], dtype=np.float64) for name in self.float_columns}
+            columns['open_timestamp'] = np.array(raw['open_timestamp'], dtype=np.int64)
+            columns['close_timestamp'] = np.array(raw['close_timestamp'], dtype=np.int64)
+            columns['num_trades'] = np.array(raw['num_trades'], dtype=np.int64)
+            columns['ignore'] = np.array(raw['ignore'])
+            columns['open_time'] = pd.DatetimeIndex(columns['open_timestamp'].view('datetime64[ms]'), tz='UTC')
+            columns['close_time'] = pd.DatetimeIndex(columns['close_timestamp'].view('datetime64[ms]'), tz='UTC')
+            df = pd.DataFrame(columns, columns=self.df_columns)
+            if not df['open_timestamp'].is_monotonic_increasing:
+                df = df.sort_values('open_timestamp', ascending=True, kind='stable')
+        else:
+            # empty range is a valid answer, unlike failure
+            df = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in self.empty_dtypes().items()})
+        return df
+
+    def empty_dtypes(self) -> dict:
+        dtypes = {name: np.float64 for name in self.float_columns}
+        dtypes.update({'open_timestamp': np.int64, 'close_timestamp': np.int64, 'num_trades': np.int64,
+                       'ignore': object, 'open_time': 'datetime64[ms, UTC]', 'close_time': 'datetime64[ms, UTC]'})
+        return {name: dtypes[name] for name in self.df_columns}
+
+
+class BinanceAggTradesGetter(Parser):
+    """
+    Aggregate trades in [startTime, endTime].
+    Endpoint allows less than 1 hour between startTime and endTime, so wider range is split into
+    windows fetched in parallel as child requests. Full pages are continued by fromId cursor.
+    """
+
+    window = 60 * 60 * 1000 - 1
+
+    def __init__(self):
+        self.df_columns = ['agg_trade_id', 'price', 'quantity', 'first_trade_id', 'last_trade_id', 'timestamp',
+                           'is_buyer_maker', 'is_best_match']
+
+    def __call__(self, single_driver: BinanceDriver, request: Request, symbol: str, startTime: int = None,
+                 endTime: int = None, fromId: int = None, limit: int = 1000) -> list:
+        if fromId is None:
+            first_end = min(startTime + self.window, endTime)
+            data = single_driver.request('agg_trades', symbol, startTime=startTime, endTime=first_end, limit=limit)
+            # the rest windows are fanned out once the first page succeeded
+            for window_start in range(startTime + self.window + 1, endTime + 1, self.window + 1):
+                window_end = min(window_start + self.window, endTime)
+                single_driver.add_child_request(request, request.child(
+                    kwargs={'startTime': window_start, 'endTime': window_end, 'limit': limit}))
+            endTime = first_end
+        else:
+            data = single_driver.request('agg_trades', symbol, fromId=fromId, limit=limit)
+            data = [trade for trade in data if trade['T'] <= endTime]
+
+        if len(data) == limit:
+            single_driver.add_child_request(request, request.child(
+                kwargs={'fromId': data[-1]['a'] + 1, 'endTime': endTime, 'limit': limit}))
+        return data
 
-    def __call__(self, single_driver: BinanceDriver, request: Request, *args, **kwargs):
-        data = single_driver.client.klines(*args, **kwargs)
+    def postprocess(self, data: list) -> 'pd.DataFrame':
         if data:
-            df = pd.DataFrame.from_records(data, columns=['open_timestamp', 'open', 'high', 'low', 'close', 'volume',
-                                                          'close_timestamp', 'quote_asset_volume', 'num_trades',
-                                                          'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume',
-                                                          'ignore'])
-            df['open_timestamp'] = df['open_timestamp'].apply(
-                lambda ts: datetime.fromtimestamp(ts / 1000).astimezone(pytz.utc).timestamp())
-            df['open_timestamp'] = df['open_timestamp'].apply(
-                lambda ts: datetime.fromtimestamp(ts / 1000).astimezone(pytz.utc).timestamp())
-
-            df['open_time'] = df.open_timestamp.apply(lambda ts: datetime.fromtimestamp(ts / 1000))
-            df['close_time'] = df.close_timestamp.apply(lambda ts: datetime.fromtimestamp(ts / 1000))
-            df = df[self.df_columns].sort_values('open_timestamp', ascending=True)
+            raw = {key: [trade[key] for trade in data] for key in 'apqflTmM'}
+            df = pd.DataFrame({
+                'agg_trade_id': np.array(raw['a'], dtype=np.int64),
+                'price': np.array(raw['p'], dtype=np.float64),
+                'quantity': np.array(raw['q'], dtype=np.float64),
+                'first_trade_id': np.array(raw['f'], dtype=np.int64),
+                'last_trade_id': np.array(raw['l'], dtype=np.int64),
+                'timestamp': pd.DatetimeIndex(np.array(raw['T'], dtype=np.int64).view('datetime64[ms]'), tz='UTC'),
+                'is_buyer_maker': np.array(raw['m'], dtype=bool),
+                'is_best_match': np.array(raw['M'], dtype=bool),
+            }, columns=self.df_columns)
         else:
             df = None
         return df
@@ -0,0 +1,68 @@
+import abc
+import time
+from queue import Queue
+from threading import Thread
+
+from multiparser.core.metrics import NullMetrics
+
+
+class ThreadedSink(abc.ABC):
+    """
+    Base class for sink writing completed RequestData on a dedicated thread.
+    put blocks while queue is full, so slow disk backpressures gathering instead of growing memory.
+    Containers write failed on are kept in failed with the exception, to be retried or reported.
+
+    Args:
+        queue_size (int): max containers waiting to be written.
+        metrics (Metrics): registry to collect write time and queue depth in.
+    """
+
+    def __init__(self, queue_size: int = 64, metrics: 'Metrics' = None):
+        self._queue = Queue(maxsize=queue_size)
+        self.metrics = metrics or NullMetrics()
+        self.metrics.gauge_fn('multiparser_sink_queue', self._queue.qsize)
+        self._working_thread = None
+
+        self.failed = list()  # (RequestData, Exception), RequestData is None if flush failed
+
+    @abc.abstractmethod
+    def write(self, request_data: 'RequestData'):
+        pass
+
+    def flush(self):
+        pass
+
+    def _record_failure(self, request_data: 'RequestData', error: Exception):
+        print(f'{self.__class__.__name__} caught {error}')
+        self.metrics.inc('multiparser_sink_errors_total')
+        self.failed.append((request_data, error))
+
+    def put(self, request_data: 'RequestData'):
+        self._queue.put(request_data)
+
+    def thread_worker(self):
+        while True:
+            request_data = self._queue.get()
+            if request_data is None:  # stop sentinel
+                break
+            started = time.perf_counter()
+            try:
+                self.write(request_data)
+            except Exception as e:
+                self._record_failure(request_data, e)
+            self.metrics.observe('multiparser_sink_write_seconds', time.perf_counter() - started)
+        try:
+            self.flush()
+        except Exception as e:
+            self._record_failure(None, e)
+
+    def start(self):
+        self._working_thread = Thread(target=self.thread_worker)
+        self._working_thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        self.join()
+
+    def join(self):
+        self._working_thread.join()
@@ -0,0 +1,113 @@
+import collections
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from multiparser.sinks.base import ThreadedSink
+
+
+def klines_partition(request_data: 'RequestData') -> dict:
+    """
+    Partition values of klines container: symbol and interval from request args.
+    """
+    symbol, interval = request_data.request.args[:2]
+    return {'symbol': symbol, 'interval': interval}
+
+
+class ParquetSink(ThreadedSink):
+    """
+    Appends DataFrames of completed containers to parquet files partitioned as
+    out_dir/symbol=.../interval=.../date=YYYY-MM-DD/part-<uuid>.parquet.
+    Rows are batched into row groups, files are written under temporary name and renamed on flush,
+    so readers never see partial files.
+    Rows of a day are written once its partition receives a later day, and the largest buffers are written
+    while more than max_buffered_rows are held, so memory does not grow with the range.
+
+    Args:
+        out_dir (str): dataset root.
+
+    Keyword Args:
+        partition_fn (callable): RequestData -> dict of partition values, klines_partition by default.
+        time_column (str): column to take date partition from.
+        row_group_size (int): max rows to batch into row group.
+        max_buffered_rows (int): max rows held in memory over all partitions.
+        max_open_files (int): least recently used partition files are finalized above it.
+        queue_size (int): max containers waiting to be written.
+        metrics (Metrics): registry to collect write time and queue depth in.
+    """
+
+    def __init__(self, out_dir: str, partition_fn: callable = klines_partition, time_column: str = 'open_time',
+                 row_group_size: int = 100_000, max_buffered_rows: int = 1_000_000, max_open_files: int = 64,
+                 queue_size: int = 64, metrics: 'Metrics' = None):
+        super().__init__(queue_size, metrics)
+        self.out_dir = out_dir
+        self.partition_fn = partition_fn
+        self.time_column = time_column
+        self.row_group_size = row_group_size
+        self.max_buffered_rows = max_buffered_rows
+        self.max_open_files = max_open_files
+
+        self._buffers = collections.defaultdict(list)  # (partition, date) -> list of DataFrames
+        self._buffered_rows = collections.defaultdict(int)
+        self._num_buffered = 0
+        self._writers = collections.OrderedDict()  # (partition, date) -> (ParquetWriter, tmp path, final path)
+
+    def write(self, request_data: 'RequestData'):
+        frames = [part.data for _, part in sorted(request_data.data.items()) if part.data is not None]
+        if not frames:
+            return
+        df = pd.concat(frames, ignore_index=True)
+        if not len(df):
+            return
+        partition = '/'.join(f'{key}={value}' for key, value in self.partition_fn(request_data).items())
+        dates = df[self.time_column].dt.strftime('%Y-%m-%d')
+        for date, date_df in df.groupby(dates, sort=False):
+            key = (partition, date)
+            self._buffers[key].append(date_df)
+            self._buffered_rows[key] += len(date_df)
+            self._num_buffered += len(date_df)
+            if self._buffered_rows[key] >= self.row_group_size:
+                self._write_row_group(key)
+
+        # days partition moved past are complete, unless windows come out of order
+        latest = dates.max()
+        for key in [key for key in self._buffers if key[0] == partition and key[1] < latest]:
+            self._write_row_group(key)
+        while self._num_buffered > self.max_buffered_rows:
+            self._write_row_group(max(self._buffered_rows, key=self._buffered_rows.get))
+
+    def _write_row_group(self, key: tuple):
+        table = pa.Table.from_pandas(pd.concat(self._buffers.pop(key), ignore_index=True), preserve_index=False)
+        self._num_buffered -= self._buffered_rows.pop(key)
+        if key not in self._writers:
+            partition, date = key
+            path = os.path.join(self.out_dir, partition, f'date={date}')
+            os.makedirs(path, exist_ok=True)
+            final_path = os.path.join(path, f'part-{uuid.uuid4().hex}.parquet')
+            tmp_path = final_path + '.tmp'
+            self._writers[key] = (pq.ParquetWriter(tmp_path, table.schema), tmp_path, final_path)
+            while len(self._writers) > self.max_open_files:
+                self._close_writer(next(iter(self._writers)))
+        self._writers.move_to_end(key)
+        writer = self._writers[key][0]
+        if not table.schema.equals(writer.schema):
+            # e.g. column of all nulls in one batch, raises if types are not compatible
+            table = table.cast(writer.schema)
+        writer.write_table(table, row_group_size=self.row_group_size)
+
+    def _close_writer(self, key: tuple):
+        writer, tmp_path, final_path = self._writers.pop(key)
+        writer.close()
+        os.replace(tmp_path, final_path)
+
+    def flush(self):
+        """
+        Write buffered rows and atomically publish all open files. Called from writer thread on stop.
+        """
+        for key in list(self._buffers):
+            self._write_row_group(key)
+        for key in list(self._writers):
+            self._close_writer(key)
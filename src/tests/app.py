@@ -1,16 +1,17 @@
 import os.path
-import time
 from threading import Thread
-import collections
+from typing import Iterable, Sized
 import datetime
 import tqdm
 import pytz
 
+from multiparser.core.cache import ResponseCache
 from multiparser.core.requests_handler import RequestsHandler
 from multiparser.core.mthread_driver import MultiThreadDriver
+from multiparser.core.post_processing import ProcessPoolStage
 from multiparser.core.request import Request
-from multiparser.custom_exceptions.cex import MaxMemoryLimit
-from multiparser.core.speedometer import Speedometer
+from multiparser.core.retry import CircuitBreaker
+from multiparser.core.speedometer import TokenBucketSpeedometer
 
 
 def _envoke_update(slider: tqdm.tqdm, item: int) -> None:
@@ -30,15 +31,30 @@ class App:
     Keyword Args:
         n_workers (int): N threads to create.
         rps (int): max requests per second speed.
+        burst (int): amount of requests allowed to go at once.
+        speedometer (Speedometer): custom speedometer, rps and burst are ignored if passed.
+        multi_driver (callable): MultiThreadDriver or AsyncMultiDriver.
+        post_processes (int): num of processes to postprocess data in, worker threads are used if 0.
+        retry_policy (RetryPolicy): policy to retry failed requests with.
+        cache_path (str): sqlite file to cache closed ranges in, memory cache only if None.
         max_memory (int): num of simultaneous requests to store in memory.
+        metrics (Metrics): registry to collect core metrics in.
     """
 
-    def __init__(self, driver_constructor: callable, n_workers: int = 2, rps: int = 10, max_memory: int = 20):
+    def __init__(self, driver_constructor: callable, n_workers: int = 2, rps: int = 10, max_memory: int = 20,
+                 burst: int = 1, speedometer: 'Speedometer' = None, multi_driver: callable = MultiThreadDriver,
+                 post_processes: int = 0, retry_policy: 'RetryPolicy' = None,
+                 cache_path: str = None, metrics: 'Metrics' = None):
         self.rh = RequestsHandler(
-            speedometer=Speedometer(max_speed=rps),
-            max_memory=max_memory
+            speedometer=speedometer or TokenBucketSpeedometer(max_speed=rps, burst=burst),
+            max_memory=max_memory,
+            post_processor=ProcessPoolStage(post_processes) if post_processes else None,
+            retry_policy=retry_policy,
+            circuit_breaker=CircuitBreaker(),
+            cache=ResponseCache(cache_path),
+            metrics=metrics
         )
-        self.mtp = MultiThreadDriver(
+        self.mtp = multi_driver(
             self.rh,
             n_workers=n_workers,
             driver_constructor=driver_constructor
@@ -55,8 +71,8 @@ class App:
         self.worker.start()
 
     def stop(self, wait=True):
-        while self.rh.num_requests_undone > 0 and wait:
-            time.sleep(1)
+        if wait:
+            self.rh.wait_done()
         self.mtp.stop()
         self.rh.stop()
         self.join()
@@ -87,34 +103,27 @@ class App:
             df.to_csv(out_filename, index=False)
         return
 
-    def _gather_loop(self, slider: tqdm.tqdm, out_dir: str, meta: dict):
-        while not self.requests_done_data.empty():
-            done_req = self.requests_done_data.get()
-            # req is: done_req = {part_id: {'data': return data, 'request': req}
-            self.save_request_data(done_req, out_dir)
-            meta['requests_get_num'] += 1
-            _envoke_update(slider, meta['requests_get_num'])
-
-    def _put_loop(self, requests_to_make: collections.deque, slider: tqdm.tqdm, meta: dict):
-        while len(requests_to_make):
-            req = requests_to_make.popleft()
-            try:
-                self.add_request(req)
-                meta['requests_post_num'] += 1
-                _envoke_total(slider, meta['requests_post_num'])
-            except MaxMemoryLimit:
-                requests_to_make.appendleft(req)
-                break
-
-    def start_parsing(self, requests_to_make: collections.deque, out_dir: str = None, verbose: bool = False) -> list:
+    def start_parsing(self, requests_to_make: Iterable['Request'], out_dir: str = None, verbose: bool = False,
+                      ordered: bool = False, on_done: callable = None, sink: 'ThreadedSink' = None) -> list:
         done_requests = list()
-
-        meta = {'requests_post_num': 0, 'requests_get_num': 0, 'requests_total_num': len(requests_to_make)}
-        with tqdm.tqdm(total=1, disable=not verbose, desc=f'total: {meta["requests_total_num"]}; post/get') as slider:
-            while self.rh.num_requests_undone or len(requests_to_make):
-                self._put_loop(requests_to_make, slider, meta)
-                self._gather_loop(slider, out_dir, meta)
-                time.sleep(0.05)
-            else:
-                self._gather_loop(slider, out_dir, meta)
+        if sink is not None:
+            sink.start()
+
+        stream = self.rh.submit(requests_to_make)
+        total = len(requests_to_make) if isinstance(requests_to_make, Sized) else None
+        with tqdm.tqdm(total=total, disable=not verbose, desc='post/get') as slider:
+            for done_req in stream.results(ordered=ordered):
+                # req is: done_req = {part_id: {'data': return data, 'request': req}
+                if sink is not None:
+                    sink.put(done_req)
+                else:
+                    self.save_request_data(done_req, out_dir)
+                if on_done is not None:
+                    on_done(done_req)
+                _envoke_total(slider, total or stream.num_submitted)
+                _envoke_update(slider, slider.n + 1)
+        if sink is not None:
+            sink.stop()
+            if sink.failed:
+                print(f'{len(sink.failed)} containers failed to be written by {sink.__class__.__name__}')
         return done_requests
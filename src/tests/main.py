@@ -1,13 +1,18 @@
 from functools import partial
-import collections
+from typing import Iterator
 import argparse
 import datetime
 import logging
-import re
+import os
 
+from multiparser.backfill.job import BackfillJob
+from multiparser.backfill.manifest import BackfillManifest
+from multiparser.backfill.merge import SeriesMerger
+from multiparser.backfill.planner import RangePlanner
+from multiparser.core.metrics import Metrics, MetricsReporter, PrometheusTextFileExporter
 from multiparser.core.request import Request
+from multiparser.core.retry import RetryPolicy
 
-from multiparser.parsers.binance import BinanceHistoryGetter
 from multiparser.drivers.binance import BinanceDriver
 
 from app import App
@@ -27,22 +32,6 @@ def convert_time(args: 'Namespace') -> tuple:
     return time_start, time_end
 
 
-def get_timedelta(granularity: str) -> datetime.timedelta:
-    value = re.findall(r'\d+', granularity)[0]
-    return datetime.timedelta(minutes=int(value))
-
-
-def split_time(time_start: datetime.datetime, time_end: datetime.datetime, granularity: str, step: int) -> list:
-    timedelta = get_timedelta(granularity)
-    timedelta = timedelta * step
-    splits = list()
-    temp = time_end
-    while temp > time_start:
-        splits.append((temp - timedelta, temp))
-        temp -= timedelta
-    return splits
-
-
 class PlaceholderClient:
     # class for demo only, matches only .klines fnc in binance driver
     def __init__(self, *_, **__):
@@ -58,33 +47,87 @@ def get_driver_builder(args: 'Namespace', typ: str = 'Spot'):
         api_key = open(args.api_key).readline().strip()
         api_secret = open(args.api_secret).readline().strip()
 
-        client = Spot(api_key, api_secret)
+        client = Spot(api_key, api_secret, show_limit_usage=True)
         return partial(BinanceDriver, client)
     else:
         client = PlaceholderClient()
         return partial(BinanceDriver, client)
 
 
-def main(args: 'Namespace'):
-    builder = get_driver_builder(args, 'test')
-    a = App(builder)
+def make_requests(args: 'Namespace', requests_handler: 'RequestsHandler',
+                  merger: SeriesMerger = None) -> Iterator[Request]:
+    # windows of exactly limit candles from the first candle of ticker, requests are created lazily while parsing
+    time_start, time_end = convert_time(args)
+    start, end = round(time_start.timestamp() * 1000), round(time_end.timestamp() * 1000)
+    planner = RangePlanner(requests_handler, args.granularity, limit=args.limit)
+    first = planner.first_open_times([args.ticker])
+    if merger is not None:
+        # nothing is requested before first candle of ticker listed after start
+        for (symbol, interval), series_start in planner.starts([args.ticker], start, first).items():
+            merger.cover(symbol, interval, start, series_start - 1)
+    return planner.requests([args.ticker], start, end, first)
 
-    getter = BinanceHistoryGetter()
 
-    dq = collections.deque()
+def append_csv(out_dir: str) -> callable:
+    # SeriesMerger emit: every contiguous prefix is appended to single file per series
+    os.makedirs(out_dir, exist_ok=True)
 
-    time_start, time_end = convert_time(args)
-    times = split_time(time_start, time_end, args.granularity, args.limit)
+    def emit(symbol: str, interval: str, df: 'pd.DataFrame'):
+        out_filename = os.path.join(out_dir, f'{symbol}_{interval}.csv')
+        df.to_csv(out_filename, mode='a', header=not os.path.exists(out_filename), index=False)
+    return emit
 
-    for (local_time_start, local_time_end) in times:
-        local_time_start = round(local_time_start.timestamp() * 1000)
-        local_time_end = round(local_time_end.timestamp() * 1000)
-        dq.append(Request(getter, args=(args.ticker, args.granularity),
-                          kwargs={'limit': args.limit, 'startTime': local_time_start, 'endTime': local_time_end}))
 
+def chain(*callbacks: callable) -> callable:
+    def call(request_data: 'RequestData'):
+        for callback in callbacks:
+            callback(request_data)
+    return call
+
+
+def main(args: 'Namespace'):
+    builder = get_driver_builder(args, 'test')
+    metrics = Metrics()
+    a = App(builder, retry_policy=RetryPolicy(), cache_path=args.cache_path, metrics=metrics)
+    reporter = None
+    if args.metrics_path is not None:
+        reporter = MetricsReporter(metrics, [PrometheusTextFileExporter(args.metrics_path)])
+        reporter.start()
     a.start()
-    a.start_parsing(dq, args.out_dir, verbose=True)
+
+    out_dir, merger = args.out_dir, None
+    if args.out_format == 'merged' and args.out_dir is not None:
+        time_start, _ = convert_time(args)
+        merger = SeriesMerger(append_csv(args.out_dir), round(time_start.timestamp() * 1000))
+        out_dir = None
+
+    if args.manifest is None:
+        requests, on_done = make_requests(args, a.rh, merger), None
+    else:
+        # resumable: only windows missing in manifest are requested
+        time_start, time_end = convert_time(args)
+        job = BackfillJob(BackfillManifest(args.manifest), [args.ticker], args.granularity,
+                          round(time_start.timestamp() * 1000), round(time_end.timestamp() * 1000), limit=args.limit,
+                          requests_handler=a.rh)
+        requests, on_done = job.requests(), job.record
+        if merger is not None:
+            for covered_start, covered_end in job.covered(args.ticker):
+                merger.cover(args.ticker, args.granularity, covered_start, covered_end)
+
+    if merger is not None:
+        on_done = merger.add if on_done is None else chain(on_done, merger.add)
+
+    sink = None
+    if args.out_format == 'parquet' and args.out_dir is not None:
+        from multiparser.sinks.parquet import ParquetSink
+        sink = ParquetSink(args.out_dir, metrics=metrics)
+
+    a.start_parsing(requests, out_dir, verbose=True, on_done=on_done, sink=sink)
     a.stop()
+    if merger is not None:
+        merger.flush()
+    if reporter is not None:
+        reporter.stop()
 
 
 def parse_args():
@@ -97,6 +140,10 @@ def parse_args():
     parser.add_argument('--time_start', type=str, help="time start. YYYY-MM-DD", default=None)
     parser.add_argument('--time_end', type=str, help="time end. YYYY-MM-DD", default=None)
     parser.add_argument('--out_dir', type=str, help='out dir path', default=None)
+    parser.add_argument('--out_format', type=str, help='csv, merged (single csv per series) or parquet', default='csv')
+    parser.add_argument('--cache_path', type=str, help='sqlite responses cache path', default=None)
+    parser.add_argument('--manifest', type=str, help='sqlite backfill manifest path to resume from', default=None)
+    parser.add_argument('--metrics_path', type=str, help='prometheus text file to export metrics to', default=None)
     return parser.parse_args()
 
 